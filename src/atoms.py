@@ -1,3 +1,4 @@
+import sys
 from abc import abstractmethod
 
 
@@ -9,6 +10,12 @@ class Atom:
     def match(self, char: str) -> bool:
         pass
 
+    @abstractmethod
+    def ranges(self) -> list:
+        '''
+        List of inclusive intervals of code points matched by the atom.
+        '''
+
 
 class Wildcard(Atom):
     '''
@@ -17,6 +24,9 @@ class Wildcard(Atom):
     def match(self, char):
         return True
 
+    def ranges(self):
+        return [(0, sys.maxunicode)]
+
     def __str__(self):
         return '*'
 
@@ -31,6 +41,9 @@ class Char(Atom):
     def match(self, char):
         return self.char == char
 
+    def ranges(self):
+        return [(ord(self.char), ord(self.char))]
+
     def __str__(self):
         return self.char
 
@@ -45,6 +58,9 @@ class CharClass(Atom):
     def match(self, char):
         return any(ord(l) <= ord(char) <= ord(r) for l, r in self.intervals)
 
+    def ranges(self):
+        return [(ord(l), ord(r)) for l, r in self.intervals]
+
     def __str__(self):
         ret = ''
 
@@ -67,6 +83,21 @@ class CharClassComplement(Atom):
     def match(self, char):
         return not any(ord(l) <= ord(char) <= ord(r) for l, r in self.intervals)
 
+    def ranges(self):
+        ret = []
+        start = 0
+
+        for l, r in sorted((ord(l), ord(r)) for l, r in self.intervals):
+            if start < l:
+                ret.append((start, l - 1))
+
+            start = max(start, r + 1)
+
+        if start <= sys.maxunicode:
+            ret.append((start, sys.maxunicode))
+
+        return ret
+
     def __str__(self):
         ret = ''
 
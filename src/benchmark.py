@@ -1,4 +1,6 @@
+import os
 import random
+import subprocess
 import sys
 import time
 import types
@@ -33,6 +35,93 @@ def bench(function, inputs: list):
               f'match/s over {enum_time} seconds')
 
 
+def measure_delays(iterable, limit: int = None) -> list:
+    '''
+    Measure the time spent between consecutive outputs of an iterable, the
+    time to get the first output is not measured. At most `limit` delays are
+    measured.
+    '''
+    iterator = iter(iterable)
+    delays = []
+
+    if next(iterator, None) is None:
+        return delays
+
+    last = time.perf_counter()
+
+    for _ in iterator:
+        now = time.perf_counter()
+        delays.append(now - last)
+        last = now
+
+        if limit is not None and len(delays) >= limit:
+            break
+
+    return delays
+
+
+def delay_stats(delays: list) -> dict:
+    '''
+    Summarize a list of delays with its median, 99th percentile and maximum.
+    '''
+    if not delays:
+        return {'outputs': 0, 'p50': 0, 'p99': 0, 'max': 0}
+
+    delays = sorted(delays)
+    return {'outputs': len(delays),
+            'p50': delays[len(delays) // 2],
+            'p99': delays[min(len(delays) - 1, len(delays) * 99 // 100)],
+            'max': delays[-1]}
+
+
+def bench_delays(function, patterns: list, sizes: list, alphabet: str,
+                 limit: int = 10**4) -> dict:
+    '''
+    Measure the delay between outputs of `function(pattern, document)` for
+    each pattern over random documents of each size. The growth of the 99th
+    percentile compared to the smallest document is displayed, it should stay
+    close to 1 as long as the delay is constant.
+    '''
+    results = dict()
+
+    for pattern in patterns:
+        for size in sizes:
+            document = random_word(size, alphabet)
+            stats = delay_stats(measure_delays(function(pattern, document),
+                                               limit))
+            results[pattern, size] = stats
+            base = results[pattern, sizes[0]]['p99']
+            growth = stats['p99'] / base if base else float('nan')
+            print(f'{pattern} ({size} chars): {stats["outputs"]} delays, '
+                  f'p50 {stats["p50"]*1e6:.1f}us, '
+                  f'p99 {stats["p99"]*1e6:.1f}us, '
+                  f'max {stats["max"]*1e6:.1f}us, '
+                  f'p99 growth {growth:.2f}')
+
+    return results
+
+
+def bench_startup(args: list, runs: int = 10, stdin: str = 'a\n') -> dict:
+    '''
+    Measure the wall time of running the command line interface with the
+    given arguments over a tiny input, which is dominated by the startup.
+    '''
+    main = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py')
+    times = []
+
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, main] + args, input=stdin, text=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                       check=True)
+        times.append(time.perf_counter() - start)
+
+    times.sort()
+    stats = {'runs': runs, 'min': times[0], 'p50': times[len(times) // 2]}
+    print(f'startup {args}: {stats}', file=sys.stderr)
+    return stats
+
+
 TRACKING = dict()
 
 
@@ -90,11 +179,36 @@ def track(function):
     return wrapper
 
 
+def count(name: str, key: str):
+    '''
+    Increment a named counter, which is displayed with tracked blocks.
+    '''
+    if name not in TRACKING:
+        TRACKING[name] = dict()
+
+    TRACKING[name][key] = TRACKING[name].get(key, 0) + 1
+
+
 def print_tracking():
-    for function, logs in sorted(TRACKING.items(), key=lambda x: -x[1]['time']):
+    for function, logs in sorted(TRACKING.items(),
+                                 key=lambda x: -x[1].get('time', 0)):
         print(f'{function}:', file=sys.stderr)
 
         for key, value in logs.items():
             print(f' - {key}: {value}', file=sys.stderr)
 
         print(file=sys.stderr)
+
+
+if __name__ == '__main__':
+    import regexp
+    from enum_mappings import enum_mappings
+
+    bench_delays(
+        lambda pattern, document: enum_mappings(regexp.compile(pattern),
+                                                document),
+        [r'(?P<x>a\w*)b', r'\w+@(?P<x>\w+)', r'(?P<x>.*)(?P<y>b+).*'],
+        [10**3, 10**4],
+        'abcd@ ')
+
+    bench_startup(['--no-debug', '-l', r'(?P<x>a+)@\w'])
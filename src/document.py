@@ -0,0 +1,151 @@
+from bisect import bisect_right
+
+
+# Default number of characters read at once from a source
+CHUNK_SIZE = 1 << 16
+
+
+class Document:
+    '''
+    Text read chunk by chunk from a file object or from an iterable of
+    strings, without requiring it to be held entirely in memory.
+
+    Slices of the document can be resolved once the chunks have been read: if
+    the source is a seekable file, the text is read again from the file,
+    otherwise the chunks have to be kept in memory.
+    '''
+    def __init__(self, source, chunk_size: int = CHUNK_SIZE,
+                 strip_newline: bool = False):
+        self.source = source
+        self.chunk_size = chunk_size
+        # If set, a single trailing newline is not considered part of the
+        # document
+        self.strip_newline = strip_newline
+        # Number of characters of the document read so far
+        self.length = 0
+
+        self.seekable = hasattr(source, 'seek') and source.seekable()
+        # Offsets of the chunks read so far, with the position in the source
+        # for seekable sources or the text of the chunk otherwise
+        self.offsets = []
+        self.positions = []
+        self.chunks = []
+
+    def read(self):
+        '''
+        Iterate over the chunks of text of the document.
+        '''
+        offset = 0
+        held_newline = False
+
+        for chunk in self.read_source():
+            self.offsets.append(offset)
+            offset += len(chunk)
+
+            if not self.seekable:
+                self.chunks.append(chunk)
+
+            if held_newline:
+                chunk = '\n' + chunk
+
+            held_newline = self.strip_newline and chunk.endswith('\n')
+
+            if held_newline:
+                chunk = chunk[:-1]
+
+            self.length += len(chunk)
+
+            if chunk:
+                yield chunk
+
+    def read_source(self):
+        '''
+        Iterate over raw chunks of the source, keeping track of positions of
+        the chunks inside of seekable sources.
+        '''
+        if not hasattr(self.source, 'read'):
+            yield from (chunk for chunk in self.source if chunk)
+            return
+
+        while True:
+            if self.seekable:
+                self.positions.append(self.source.tell())
+
+            chunk = self.source.read(self.chunk_size)
+
+            if not chunk:
+                if self.seekable:
+                    self.positions.pop()
+
+                return
+
+            yield chunk
+
+    def scan(self):
+        '''
+        Iterate over the chunks of text of a seekable source without reading
+        the document, the position of the source is restored afterwards so
+        that the document can then be read.
+        '''
+        position = self.source.tell()
+
+        try:
+            held = ''
+
+            for chunk in iter(lambda: self.source.read(self.chunk_size), ''):
+                if held:
+                    yield held
+
+                held = chunk
+
+            if self.strip_newline and held.endswith('\n'):
+                held = held[:-1]
+
+            if held:
+                yield held
+        finally:
+            self.source.seek(position)
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            if key < 0:
+                key += len(self)
+
+            if not 0 <= key < len(self):
+                raise IndexError('document index out of range')
+
+            return self[key:key+1]
+
+        start, stop, step = key.indices(len(self))
+
+        if step != 1:
+            return self[start:stop][::step]
+
+        if start >= stop:
+            return ''
+
+        chunk_id = bisect_right(self.offsets, start) - 1
+
+        if not self.seekable:
+            ret = []
+            offset = self.offsets[chunk_id]
+
+            while offset < stop:
+                chunk = self.chunks[chunk_id]
+                ret.append(chunk[max(0, start - offset):stop - offset])
+                offset += len(chunk)
+                chunk_id += 1
+
+            return ''.join(ret)
+
+        # Read the text from the beginning of the chunk containing the slice,
+        # then restore the position of the source
+        current_position = self.source.tell()
+        self.source.seek(self.positions[chunk_id])
+        skip = start - self.offsets[chunk_id]
+        ret = self.source.read(skip + stop - start)[skip:]
+        self.source.seek(current_position)
+        return ret
@@ -1,35 +1,255 @@
+from collections import deque
+from itertools import islice
+
+from document import Document
+from enum_mappings import parallel
 from enum_mappings.indexed_dag import IndexedDag
 from enum_mappings.jump import EmptyLevel
 from enum_mappings.naive import naive_enum_mappings
+from enum_mappings.trimming import MemoryBudget, TrimmingPolicy
 from mapping import match_of_mapping
 from va import VA
 
 
-def compile_matches(va: VA, text: str) -> IndexedDag:
+# Number of records of `enum_matches_batch` handled at once by a worker
+RECORDS_BATCH = 256
+# Memory budget of the DAG of a single record
+RECORD_BUDGET = 1 << 20
+
+
+def compile_matches(va: VA, text, trimming: TrimmingPolicy = None,
+                    prune: bool = False, reuse: IndexedDag = None,
+                    **options) -> IndexedDag:
     '''
     Compile the list of matches of a Variable Automata over a text into a DAG.
+    The text can be a string or a source of chunks accepted by `IndexedDag`,
+    which can use a custom trimming policy and pruning of vertices that can't
+    reach a final state. Other options are given to `IndexedDag`.
+
+    If a DAG of the same automaton is given as `reuse`, it is reset with the
+    text instead of building a new one, its trimming policy and caches are
+    kept.
     '''
-    return IndexedDag(va, text)
+    if reuse is not None:
+        reuse.reset(text, prune, options.get('progress', True))
+        return reuse
+
+    return IndexedDag(va, text, trimming, prune, **options)
 
 
-def enum_mappings(va: VA, text: str):
+def prefilter_windows(va: VA, text):
     '''
-    Iterate over the mappings of the given Variable Automaton over a text.
+    Check a text with the prefilter of an automaton compiled from a regexp,
+    before building a DAG. Get the list of disjoint windows `(start, end)` of
+    the text that contain all matches, which is empty if the text misses a
+    literal required by the pattern, or None if the whole text has to be
+    considered.
+
+    Matches are located in strings when they have a bounded length. A
+    `Document` over a seekable source that was not read yet is scanned for
+    required literals, but matches can't be located in it.
     '''
+    if va.prefilter is None:
+        return None
+
+    if isinstance(text, str):
+        if not va.prefilter.accepts(text):
+            return []
+
+        return va.prefilter.windows(text)
+
+    if isinstance(text, Document) and text.seekable and not text.offsets:
+        if not va.prefilter.accepts_chunks(text.scan()):
+            return []
+
+    return None
+
+
+def enum_mappings(va: VA, text, order: str = None, reverse: bool = False,
+                  **options):
+    '''
+    Iterate over the mappings of the given Variable Automaton over a text. If
+    an `order` is specified, the mappings assigning the variable `match` are
+    sorted as described in `IndexedDag.sorted_iter`. Other options are given
+    to `compile_matches`.
+
+    The text is first checked with the prefilter of the automaton, see
+    `prefilter_windows`.
+    '''
+    windows = prefilter_windows(va, text)
+
+    if windows is not None:
+        return enum_windows(va, text, windows, order, reverse, **options)
+
     try:
-        dag = compile_matches(va, text)
+        dag = compile_matches(va, text, **options)
     except EmptyLevel:
         return iter([])
 
+    if order is not None:
+        return dag.sorted_iter(order, reverse)
+
     return iter(dag)
 
 
-def enum_matches(va: VA, text: str):
+def enum_windows(va: VA, text: str, windows: list, order: str = None,
+                 reverse: bool = False, **options):
     '''
-    Iterate over the matches of the given Variable Automaton over a text.
+    Iterate over the mappings of a Variable Automaton over disjoint windows
+    of a text, as `enum_mappings` does. As windows are disjoint, iterating
+    over them in order keeps mappings sorted.
     '''
-    for mapping in enum_mappings(va, text):
+    if reverse:
+        windows = windows[::-1]
+
+    for start, end in windows:
+        try:
+            dag = compile_matches(va, text[start:end],
+                                  **{'progress': False, **options})
+        except EmptyLevel:
+            continue
+
+        mappings = iter(dag) if order is None \
+            else dag.sorted_iter(order, reverse)
+
+        for mapping in mappings:
+            yield [(marker, index + start) for marker, index in mapping]
+
+
+def enum_matches(va: VA, text, order: str = None, reverse: bool = False,
+                 **options):
+    '''
+    Iterate over the matches of the given Variable Automaton over a text, the
+    text of the matches is resolved from the document only when accessed.
+    '''
+    if not isinstance(text, (str, Document)):
+        text = Document(text)
+
+    for mapping in enum_mappings(va, text, order, reverse, **options):
         match = match_of_mapping(text, va.variables, mapping)
 
         if match.span[0] is not None and match.span[1] is not None:
             yield match
+
+
+def record_dag(va: VA) -> IndexedDag:
+    '''
+    Get an empty DAG to be reused for short records with the `reuse` option
+    of `compile_matches`. Its levels are only cleaned if a record needs more
+    than `RECORD_BUDGET` bytes.
+    '''
+    return IndexedDag(va, '', MemoryBudget(RECORD_BUDGET), progress=False)
+
+
+def match_records(va: VA, records) -> list:
+    '''
+    Get the list of pairs `(index, match)` for a list of pairs `(index,
+    record)` of short strings. No progress bar is displayed for records, and
+    levels are only cleaned if a record needs more than `RECORD_BUDGET` bytes.
+
+    A single DAG is reset for each record, so that the transitions computed
+    during the enumeration of a record are cached for the next ones.
+    '''
+    dag = record_dag(va)
+    return [(index, match)
+            for index, record in records
+            for match in enum_matches(va, record, progress=False, reuse=dag)]
+
+
+def match_records_worker(records) -> list:
+    return match_records(parallel.WORKER_VA, records)
+
+
+def enum_matches_batch(va: VA, records, workers: int = None):
+    '''
+    Iterate over the matches of an automaton over an iterable of short
+    records, as pairs `(index, match)` where index is the position of the
+    record in the input.
+
+    Tables computed by the automaton are shared between all records, and each
+    batch of records reuses a single DAG, see `match_records`. If `workers`
+    is specified, records are split into batches which are handled
+    by a pool of processes, at most `2 * workers` batches are pending at
+    once.
+    '''
+    records = enumerate(records)
+
+    # Compute the tables required by all records beforehand, so that they are
+    # shared with workers
+    va.get_closure_for_assignations()
+    va.get_marker_closure()
+    va.get_alphabet_partition()
+
+    if workers is None:
+        for batch in iter(lambda: list(islice(records, RECORDS_BATCH)), []):
+            yield from match_records(va, batch)
+
+        return
+
+    #pylint: disable=import-outside-toplevel
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(workers, initializer=parallel.init_worker,
+                             initargs=(va,)) as pool:
+        pending = deque()
+
+        for batch in iter(lambda: list(islice(records, RECORDS_BATCH)), []):
+            pending.append(pool.submit(match_records_worker, batch))
+
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+
+        while pending:
+            yield from pending.popleft().result()
+
+
+def enum_tagged_matches(va: VA, text):
+    '''
+    Iterate over the matches of an automaton compiled from several patterns
+    with `regexp.compile_many`, as pairs of the name of the pattern and the
+    match.
+    '''
+    if not isinstance(text, (str, Document)):
+        text = Document(text)
+
+    variables_of = dict()
+
+    for variable, name in va.pattern_of.items():
+        variables_of.setdefault(name, []).append(variable)
+
+    for mapping in enum_mappings(va, text):
+        if not mapping:
+            continue
+
+        name = va.pattern_of[mapping[0][0].variable]
+        match = match_of_mapping(text, variables_of[name], mapping)
+
+        if match.span[0] is not None and match.span[1] is not None:
+            yield name, match
+
+
+def count_matches(va: VA, text, **options) -> int:
+    '''
+    Count the matches of the given Variable Automaton over a text, without
+    enumerating them. Options are given to `compile_matches`.
+    '''
+    windows = prefilter_windows(va, text)
+
+    if windows is not None:
+        return sum(count_window(va, text[start:end], **options)
+                   for start, end in windows)
+
+    try:
+        dag = compile_matches(va, text, **options)
+    except EmptyLevel:
+        return 0
+
+    return dag.count_matches()
+
+
+def count_window(va: VA, window: str, **options) -> int:
+    try:
+        return compile_matches(va, window, **{'progress': False,
+                                              **options}).count_matches()
+    except EmptyLevel:
+        return 0
@@ -0,0 +1,43 @@
+from collections import OrderedDict
+
+import benchmark
+
+
+# Default number of entries of caches used during the enumeration
+DEFAULT_CACHE_SIZE = 1 << 12
+
+
+class LRUCache:
+    '''
+    Cache holding at most `maxsize` entries, the least recently used entry is
+    evicted first. Hits and misses are reported through `benchmark` under the
+    name of the cache.
+    '''
+    def __init__(self, name: str, maxsize: int = DEFAULT_CACHE_SIZE):
+        self.name = name
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+
+    def get(self, key, compute):
+        '''
+        Get the value of a key, calling `compute()` to get it if it is not in
+        the cache.
+        '''
+        if key in self.entries:
+            benchmark.count(self.name, 'hits')
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+        benchmark.count(self.name, 'misses')
+        value = compute()
+
+        if self.maxsize > 0:
+            self.entries[key] = value
+
+            if len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+        return value
+
+    def clear(self):
+        self.entries.clear()
@@ -1,145 +1,490 @@
-from collections import deque
+import heapq
+import random
 
-import tqdm
+import numpy
 
 import benchmark
+from document import CHUNK_SIZE, Document
+from enum_mappings import parallel, storage
+from enum_mappings.cache import DEFAULT_CACHE_SIZE, LRUCache
+from enum_mappings.pruning import CoreachableLevels, StaticCoreachable
 from enum_mappings.jump import Jump
+from enum_mappings.trimming import ExponentialDepth, TrimmingPolicy
+from mapping import Variable
 from va import VA
 
 
-class IndexedDag:
+def progress_bar(total: int):
     '''
-    DAG built from the product automaton of a variable automaton and a text.
-
-    The structure allows to enumerate efficiently all the distinct matches of
-    the input automata over the input text.
+    Get a progress bar of the preprocessing of a document, tqdm is only loaded
+    when a progress bar is displayed.
     '''
-    @benchmark.track
-    def __init__(self, va: VA, document: str):
-        self.va = va
-        self.document = document
+    import tqdm  #pylint: disable=import-outside-toplevel
+    return tqdm.tqdm(total=total, desc='preprocessing', unit='B',
+                     unit_scale=True, dynamic_ncols=True)
 
-        self.jump = Jump([self.va.initial], self.va.get_adj_for_assignations())
-        levels_iter = tqdm.trange(len(self.document),
-                                  desc='preprocessing',
-                                  unit='B', unit_scale=True,
-                                  dynamic_ncols=True)
 
-        for curr_level in levels_iter:
-            curr_letter = self.document[curr_level]
-            self.jump.next_level(self.va.get_adj_for_char(curr_letter),
-                                 self.va.get_adj_for_assignations())
+def requirements(markers) -> frozenset:
+    '''
+    Get the requirements of `IndexedDag.count` from a list of markers which
+    must all be contained in a mapping.
+    '''
+    return frozenset(frozenset([marker]) for marker in markers)
 
-            # Clean the level at exponential depth
-            depth = curr_level & -curr_level
 
-            for level in range(curr_level, curr_level - depth, -1):
-                self.jump.clean_level(level, self.va.get_adj_for_assignations())
+def unsatisfied(missing: frozenset, markers) -> frozenset:
+    '''
+    Get the requirements of `missing` which are not satisfied by any of the
+    given markers.
+    '''
+    markers = set(markers)
+    return frozenset(alternatives for alternatives in missing
+                     if alternatives.isdisjoint(markers))
 
-            levels_iter.set_postfix({'levels': len(self.jump.levelset.vertices)})
 
+class NoProgress:
+    '''
+    Replacement for a progress bar which is not displayed.
+    '''
+    def update(self, _size):
+        pass
 
-    def follow_SpSm(self, gamma: list, Sp: list, Sm: list):
-        adj = self.va.get_rev_assignations()
-        Sm = set(Sm)
-        Sp = set(Sp)
-        path_set = {state: set() for state in gamma}
-        queue = deque(gamma.copy())
+    def set_postfix(self, _postfix):
+        pass
 
-        while queue:
-            source = queue.popleft()
+    def close(self):
+        pass
 
-            for label, target in adj[source]:
-                if label not in Sm:
-                    if target not in path_set:
-                        queue.append(target)
 
-                    new_ps = path_set[source].copy()
+class IndexedDag:
+    '''
+    DAG built from the product automaton of a variable automaton and a text.
+
+    The structure allows to enumerate efficiently all the distinct matches of
+    the input automata over the input text.
+    '''
+    @benchmark.track
+    def __init__(self, va: VA, document, trimming: TrimmingPolicy = None,
+                 prune: bool = False,
+                 cache_size: int = DEFAULT_CACHE_SIZE, progress: bool = True):
+        '''
+        Build the DAG of a variable automaton over a document, which can either
+        be a string, a `Document` or any source accepted by `Document` (a file
+        object or an iterable of strings) which will be read chunk by chunk.
+
+        The `trimming` policy decides which levels are cleaned during the
+        build, by default levels are cleaned at exponential depth. Statistics
+        of the cleanups can be read from `self.trimming`.
+
+        If `prune` is set, vertices that can't reach a final state are not
+        added to the DAG. When the document is a string, this is computed
+        exactly by a backward pass over the document, otherwise only states
+        that can't reach a final state at all are pruned.
+
+        During the enumeration, the transitions computed from a same set of
+        vertices are cached, `cache_size` bounds the number of entries kept.
+
+        A progress bar is displayed during the build unless `progress` is
+        unset.
+        '''
+        self.va = va
+        self.init_caches(cache_size)
+        self.trimming = ExponentialDepth() if trimming is None else trimming
+        self.build(document, prune, progress)
+
+    def reset(self, document, prune: bool = False, progress: bool = False):
+        '''
+        Build the DAG of the same automaton over a new document, as done by
+        the constructor. The cache of `next_level` only depends on the
+        automaton and is kept, so that it is shared between all the documents
+        handled by the instance. Iterators over the previous document must no
+        longer be used.
+        '''
+        self.jump_cache.clear()
+        self.counts.clear()
+
+        # DAGs loaded from a file have no trimming policy
+        if self.trimming is None:
+            self.trimming = ExponentialDepth()
+
+        self.trimming.reset()
+        self.build(document, prune, progress)
+
+    def build(self, document, prune: bool, progress: bool):
+        # Classes of chars of the whole document, if they are computed ahead
+        classes = None
+        coreachable = None
+
+        if isinstance(document, str):
+            chunks = (document[start:start+CHUNK_SIZE]
+                      for start in range(0, len(document), CHUNK_SIZE))
+            total = len(document)
+
+            if prune:
+                classes = self.va.classify(document)
+                coreachable = CoreachableLevels(self.va, classes)
+        else:
+            if not isinstance(document, Document):
+                document = Document(document)
+
+            chunks = document.read()
+            total = None
+
+            if prune:
+                coreachable = StaticCoreachable(self.va)
+
+        if classes is not None:
+            levels = ((chunk, classes[start:start+len(chunk)])
+                      for start, chunk in zip(range(0, total, CHUNK_SIZE),
+                                              chunks))
+        else:
+            levels = ((chunk, self.va.classify(chunk)) for chunk in chunks)
 
-                    if label in Sp:
-                        new_ps.add(label)
+        self.document = document
+        self.jump = Jump([self.va.initial],
+                         self.va.get_closure_for_assignations())
+        progress = progress_bar(total) if progress else NoProgress()
+        curr_level = 0
+
+        for chunk, classes in levels:
+            for curr_class in classes:
+                self.jump.next_level(
+                    self.va.get_table_for_class(int(curr_class)),
+                    self.va.get_closure_for_assignations(),
+                    coreachable[curr_level + 1]
+                    if coreachable is not None else None)
+
+                self.trimming(self.jump, curr_level,
+                              self.va.get_closure_for_assignations())
+                curr_level += 1
+
+            progress.update(len(chunk))
+            progress.set_postfix({'levels': len(self.jump.levelset.vertices)})
+
+        progress.close()
+
+    def save(self, path):
+        '''
+        Save the preprocessed structure in a file, it can then be loaded
+        again with `IndexedDag.load` without computing it again.
+        '''
+        storage.save_arrays(path, self.jump.to_arrays(),
+                            {'fingerprint': self.va.fingerprint()})
+
+    def init_caches(self, cache_size: int):
+        self.next_level_cache = LRUCache('IndexedDag.next_level cache',
+                                         cache_size)
+        self.jump_cache = LRUCache('Jump cache', cache_size)
+        # Number of mappings that can be output from a frame, see `count`
+        self.counts = dict()
+
+    @classmethod
+    def load(cls, path, va: VA, document=None,
+             cache_size: int = DEFAULT_CACHE_SIZE):
+        '''
+        Load a structure saved with `save` for the same automaton, the file
+        is memory-mapped so that the enumeration can start immediately. The
+        document is only required to resolve the text of matches.
+        '''
+        meta, arrays = storage.load_arrays(path)
+
+        if meta['fingerprint'] != va.fingerprint():
+            raise ValueError(f'{path} was built with a different automaton')
+
+        ret = cls.__new__(cls)
+        ret.va = va
+        ret.init_caches(cache_size)
+        ret.trimming = None
+        ret.document = document
+        ret.jump = Jump.from_arrays(arrays)
+        return ret
 
-                    # If the state has a failure anotation, we can skip it
-                    if target in path_set and path_set[target] is None:
-                        continue
+    @benchmark.track
+    def next_level(self, gamma: numpy.ndarray):
+        '''
+        Iterate over the sets of markers `Sp` that can be read backwards from
+        the vertices of gamma inside of a level, together with the mask of
+        vertices reached by reading exactly these markers. Sets of markers
+        are yielded in decreasing order of their encoding as integers.
+        '''
+        closure = self.va.get_marker_closure()
+        groups = dict()
+
+        for state in numpy.flatnonzero(gamma):
+            for mask, targets in closure[state].items():
+                groups.setdefault(mask, []).extend(targets)
+
+        for mask in sorted(groups, reverse=True):
+            new_gamma = numpy.zeros(self.va.nb_states, dtype=bool)
+            new_gamma[groups[mask]] = True
+            yield self.va.markers_of_mask(mask), new_gamma
+
+    def cached_next_level(self, gamma: numpy.ndarray) -> list:
+        '''
+        Get the list of results of `next_level`, which only depend on gamma.
+        '''
+        return self.next_level_cache.get(
+            gamma.tobytes(), lambda: list(self.next_level(gamma)))
+
+    def cached_jump(self, level: int, gamma: numpy.ndarray):
+        '''
+        Get the result of a jump from the vertices of gamma at a given level.
+        '''
+        return self.jump_cache.get((level, gamma.tobytes()),
+                                   lambda: self.jump(level, gamma))
+
+    def root_frame(self):
+        '''
+        Get the frame the enumeration starts from. A frame is a triple
+        (level, gamma, mapping), where gamma is a mask of states, from which
+        the mappings completing the given partial mapping are enumerated.
+        '''
+        final = numpy.zeros(self.va.nb_states, dtype=bool)
+        final[self.va.final] = True
+        return self.jump.last_level, final, []
+
+    def expand_frame(self, level: int, gamma: numpy.ndarray, mapping: list):
+        '''
+        Compute the mappings output by a frame and the list of frames it
+        spawns, in the order they are pushed on the stack of the enumeration.
+        '''
+        results = []
+        children = []
+
+        for Sp, new_gamma in self.cached_next_level(gamma):
+            if not new_gamma.any():
+                continue
 
-                    # Keep track of the biggest path set for each vertex of the
-                    # level, if two path have incomparable path sets, we may
-                    # anotate them with a failure anotation (None)
-                    if target not in path_set or new_ps >= path_set[target]:
-                        path_set[target] = new_ps
-                    elif not (path_set[target] >= new_ps
-                              or path_set[target] <= new_ps):
-                        path_set[target] = None
+            new_mapping = mapping.copy()
+            new_mapping.extend((marker, level) for marker in Sp)
 
-        return [vertex for vertex, ps in path_set.items() if ps == Sp]
+            if level == 0 and new_gamma[self.va.initial]:
+                results.append(new_mapping)
+            else:
+                new_level, new_gamma = self.cached_jump(level, new_gamma)
 
-    @benchmark.track
-    def next_level(self, gamma: list):
-        adj = self.va.get_rev_assignations()
-        K = set()
+                if new_gamma.any():
+                    children.append((new_level, new_gamma, new_mapping))
 
-        # Get list of variables that are part of the level
-        stack = gamma.copy()
-        mark = set(gamma)
+        return results, children
 
+    def enumerate_frames(self, stack: list):
+        '''
+        Iterate over the mappings spawned by a stack of frames, the last frame
+        of the stack is expanded first.
+        '''
         while stack:
-            source = stack.pop()
+            results, children = self.expand_frame(*stack.pop())
+            yield from results
+            stack.extend(children)
 
-            for label, target in adj[source]:
-                K.add(label)
-
-                if target not in mark:
-                    mark.add(target)
-                    stack.append(target)
+    def __iter__(self):
+        return self.enumerate_frames([self.root_frame()])
 
-        K = list(K)
-        stack = [([], [])]
+    @benchmark.track
+    def count_mappings(self, required: list = ()) -> int:
+        '''
+        Count the mappings of the DAG without enumerating them, if a list of
+        `required` markers is given, only mappings containing all of these
+        markers are counted.
+        '''
+        level, gamma, _ = self.root_frame()
+        return self.count(level, gamma, requirements(required))
+
+    def count_matches(self) -> int:
+        '''
+        Count the mappings that define a match, that is the mappings opening
+        and closing a variable named `match`. Several variables can have this
+        name, e.g. in an automaton built by `regexp.compile_many`.
+        '''
+        level, gamma, _ = self.root_frame()
+        missing = frozenset(
+            frozenset(marker for marker in self.va.get_markers()
+                      if marker.variable.name == 'match'
+                      and marker.type == marker_type)
+            for marker_type in Variable.Marker.Type)
+        return self.count(level, gamma, missing)
+
+    def count(self, level: int, gamma: numpy.ndarray,
+              missing: frozenset) -> int:
+        '''
+        Count the mappings output by the frames starting at a given level from
+        the vertices of gamma, satisfying all of the `missing` requirements:
+        sets of alternative markers of which a mapping contains one. The
+        count of each visited frame is memoized.
+        '''
+        stack = [(level, gamma, missing)]
 
         while stack:
-            Sp, Sm = stack.pop()
-            gamma2 = self.follow_SpSm(gamma, Sp, Sm)
+            level, gamma, missing = stack[-1]
+            key = (level, gamma.tobytes(), missing)
 
-            if not gamma2:
+            if key in self.counts:
+                stack.pop()
                 continue
 
-            while len(Sp) + len(Sm) < len(K):
-                depth = len(Sp) + len(Sm)
-                Sp.append(K[depth])
-                gamma2 = self.follow_SpSm(gamma, Sp, Sm)
-
-                if gamma2:
-                    new_Sp = Sp.copy()
-                    new_Sm = Sm.copy()
-                    new_Sm.append(new_Sp.pop())
-                    stack.append((new_Sp, new_Sm))
-                else:
-                    Sm.append(Sp.pop())
-                    gamma2 = None
+            total = 0
+            children = []
 
-            if gamma2 is None:
-                gamma2 = self.follow_SpSm(gamma, Sp, Sm)
+            for Sp, new_gamma in self.cached_next_level(gamma):
+                if not new_gamma.any():
+                    continue
 
-            yield list(Sp), gamma2
+                new_missing = unsatisfied(missing, Sp)
 
-    def __iter__(self):
-        # a stack of pairs (gamma, mapping)
-        stack = [(len(self.document), list(self.va.final), [])]
+                if level == 0 and new_gamma[self.va.initial]:
+                    total += not new_missing
+                    continue
 
-        while stack:
-            level, gamma, mapping = stack.pop()
+                new_level, new_gamma = self.cached_jump(level, new_gamma)
+                child_key = (new_level, new_gamma.tobytes(), new_missing)
 
-            for Sp, new_gamma in self.next_level(gamma):
-                if not new_gamma:
+                if not new_gamma.any():
                     continue
 
-                new_mapping = mapping.copy()
-                new_mapping.extend((marker, level) for marker in Sp)
-
-                if level == 0 and self.va.initial in new_gamma:
-                    yield new_mapping
+                if child_key in self.counts:
+                    total += self.counts[child_key]
                 else:
-                    new_level, new_gamma = self.jump(level, new_gamma)
+                    children.append((new_level, new_gamma, new_missing))
+
+            # The frame is counted again once all its children are counted
+            if children:
+                stack.extend(children)
+            else:
+                self.counts[key] = total
+                stack.pop()
+
+        return self.counts[key]
+
+    def nth(self, index: int, required: list = ()) -> list:
+        '''
+        Get the mapping at a given index in the order of the enumeration,
+        without enumerating the mappings before it. If a list of `required`
+        markers is given, the mappings not containing all of them are not
+        taken into account.
+        '''
+        required = requirements(required)
+        frame = self.root_frame()
+
+        if index < 0:
+            index += self.count(frame[0], frame[1], required)
+
+        while index >= 0:
+            results, children = self.expand_frame(*frame)
+            results = [mapping for mapping in results if not unsatisfied(
+                required, [marker for marker, _ in mapping])]
+
+            if index < len(results):
+                return results[index]
+
+            index -= len(results)
+
+            # Children are expanded in the reverse order they are pushed
+            for level, gamma, mapping in reversed(children):
+                missing = unsatisfied(required,
+                                      [marker for marker, _ in mapping])
+                count = self.count(level, gamma, missing)
+
+                if index < count:
+                    frame = (level, gamma, mapping)
+                    break
+
+                index -= count
+            else:
+                break
+
+        raise IndexError('mapping index out of range')
+
+    def sample(self, size: int, seed=None, required: list = ()) -> list:
+        '''
+        Draw `size` distinct mappings uniformly at random, the result is
+        reproducible for a given seed.
+        '''
+        level, gamma, _ = self.root_frame()
+        total = self.count(level, gamma, requirements(required))
+
+        if not 0 <= size <= total:
+            raise ValueError('sample larger than the number of mappings')
+
+        # The number of mappings may exceed the range of `random.sample`,
+        # indices are kept in the order they are drawn
+        rng = random.Random(seed)
+        indices = dict()
+
+        while len(indices) < size:
+            indices[rng.randrange(total)] = None
+
+        return [self.nth(index, required) for index in indices]
+
+    def sorted_iter(self, order: str = 'span', reverse: bool = False,
+                    variable: str = 'match'):
+        '''
+        Iterate over the mappings sorted by the span of a variable, either by
+        `(start, end)` if order is `'span'` or by `end` if order is `'end'`.
+        Mappings that don't assign the variable are not output.
+
+        Frames are expanded lazily from a priority queue, ordered by a bound
+        of the keys of the mappings they can output: as markers are read
+        backwards, a marker that is not assigned yet will be at a level lower
+        than the level of the frame. Thus the descending order is output
+        with a short delay, while the ascending order by span may require to
+        expand most frames before the first output.
+        '''
+        if order == 'span':
+            marker_types = [Variable.Marker.Type.OPEN,
+                            Variable.Marker.Type.CLOSE]
+        elif order == 'end':
+            marker_types = [Variable.Marker.Type.CLOSE]
+        else:
+            raise ValueError(f'unknown order: {order}')
+
+        def bound(level, mapping):
+            values = {marker.type: index for marker, index in mapping
+                      if marker.variable.name == variable}
+            bounds = [values.get(marker_type, level if reverse else 0)
+                      for marker_type in marker_types]
+
+            if reverse:
+                return tuple(-value for value in bounds)
+
+            return tuple(bounds)
+
+        # Heap of (key, kind, counter, item): for a same key, mappings are
+        # output before frames are expanded
+        heap = [(bound(self.jump.last_level, []), 1, 0, self.root_frame())]
+        counter = 1
+
+        while heap:
+            _, kind, _, item = heapq.heappop(heap)
+
+            if kind == 0:
+                yield item
+                continue
 
-                    if new_gamma:
-                        stack.append((new_level, new_gamma, new_mapping))
+            results, children = self.expand_frame(*item)
+
+            for mapping in results:
+                assigned = {marker.type for marker, _ in mapping
+                            if marker.variable.name == variable}
+
+                if len(assigned) == 2:
+                    heapq.heappush(heap, (bound(0, mapping), 0, counter,
+                                          mapping))
+                    counter += 1
+
+            for frame in children:
+                heapq.heappush(heap, (bound(frame[0], frame[2]), 1, counter,
+                                      frame))
+                counter += 1
+
+    def parallel_iter(self, workers: int, ordered: bool = False,
+                      queue_size: int = parallel.QUEUE_SIZE):
+        '''
+        Iterate over the mappings using several worker processes. If
+        `ordered` is set, the mappings are output in the same order as with
+        `iter`, otherwise they are output as soon as they are found.
+        '''
+        if ordered:
+            return parallel.enumerate_ordered(self, workers, queue_size)
+
+        return parallel.enumerate_unordered(self, workers, queue_size)
@@ -1,7 +1,9 @@
 import numpy
 
 import benchmark
-from enum_mappings.levelset import LevelSet
+from enum_mappings.levelset import VERTEX, LevelSet
+from enum_mappings import matrix
+from enum_mappings.matrix import WORD, BitMatrix, SparseMatrix, nb_words
 
 
 class EmptyLevel(Exception):
@@ -19,12 +21,14 @@ class Jump:
     first layer by being able to skip any path that do not contain any
     assignation edges.
     '''
-    def __init__(self, initial_level, nonjump_adj):
+    def __init__(self, initial_level, nonjump_closure):
         # Layers in the levelset will be built one by one
         self.levelset = LevelSet()
         self.last_level = 0
 
-        # Closest level where an assignation is done accessible from any node
+        # Closest level where an assignation is done accessible from any node:
+        # jl[level][i] is given for the i-th vertex of the level, or -1 for
+        # vertices that are only reached by non-jumpable edges
         self.jl = dict()
         # Set of levels accessible from any level using jl, and reverse of this
         # dictionnary
@@ -34,78 +38,97 @@ class Jump:
         # the accessibility of vertices from level i to level j
         self.reach = dict()
 
-        # Set of vertices that can't be jumped since it has an ingoing
-        # non-jumpable edge (TODO: it may only be required to store it for the
-        # last level)
-        self.nonjump_vertices = set()
+        # Mask of vertices of the last level that can't be jumped since they
+        # have an ingoing non-jumpable edge
+        self.nonjump_vertices = None
         # Keep track of number of jumps to a given vertex
         self.count_ingoing_jumps = dict()
+        # Levels that may contain useless vertices: levels that were never
+        # cleaned and levels that lost ingoing jumps since they were cleaned
+        self.dirty = set()
 
         # Register initial level
-        for state in initial_level:
-            self.levelset.register(state, self.last_level)
-            self.jl[state, self.last_level] = 0
-
-        self.extend_level(0, nonjump_adj)
+        initial_level = numpy.unique(initial_level)
+        self.extend_level(0, initial_level, numpy.zeros(len(initial_level)),
+                          nonjump_closure)
         self.count_ingoing_jumps[0] = numpy.zeros(
             len(self.levelset.vertices[0]), dtype=int)
 
     @benchmark.track
-    def next_level(self, jump_adj, nonjump_adj):
+    def next_level(self, jump_table, nonjump_closure, coreachable=None):
         '''
-        Compute next level given the adjacency list of jumpable edges from
-        current level to the next one and adjacency list of non-jumpable edges
-        inside the next level.
+        Compute next level given the successor table of jumpable edges from
+        current level to the next one and the closure table of non-jumpable
+        edges inside the next level.
+
+        The whole frontier is processed at once: `jump_table[source, target]`
+        is set iff there is a jumpable edge from source to target. If a mask of
+        `coreachable` states is given, other states are not added to the
+        level.
         '''
         last_level = self.last_level
         next_level = self.last_level + 1
 
+        edges = jump_table[self.levelset.vertices[last_level]]
+        reached = edges.any(axis=0)
 
-        # Register jumpable transitions from this level to next one
-        for source in self.levelset.vertices[last_level]:
-            for target in jump_adj[source]:
-                if (target, next_level) not in self.jl:
-                    self.levelset.register(target, next_level)
-                    self.jl[target, next_level] = 0
+        if coreachable is not None:
+            reached &= coreachable
 
-                if (source, last_level) in self.nonjump_vertices:
-                    self.jl[target, next_level] = last_level
-                else:
-                    self.jl[target, next_level] = max(self.jl[target, next_level],
-                                                      self.jl[source, last_level])
+        targets = numpy.flatnonzero(reached)
 
-        if next_level not in self.levelset.vertices:
+        if targets.size == 0:
             raise EmptyLevel
 
+        # A target reached from a non-jumpable vertex can't jump further than
+        # the last level, otherwise it inherits the furthest jump level of its
+        # sources
+        edges = edges[:, targets]
+        targets_jl = numpy.where(edges, self.jl[last_level][:, None], -1)
+        targets_jl = targets_jl.max(axis=0)
+        targets_jl[edges[self.nonjump_vertices].any(axis=0)] = last_level
+
         # TODO: isn't there a better way of organizing this?
-        self.extend_level(next_level, nonjump_adj)
-        self.compute_reach(next_level, jump_adj)
+        self.extend_level(next_level, targets, targets_jl, nonjump_closure,
+                          coreachable)
+        self.compute_reach(next_level, jump_table)
         self.last_level = next_level
 
     @benchmark.track
-    def extend_level(self, level, nonjump_adj):
+    def extend_level(self, level, targets, targets_jl, nonjump_closure,
+                     coreachable=None):
         '''
-        Extend current level by reading non-jumpable edges inside the given
-        level.
+        Register a new level made of vertices reached by jumpable edges with
+        their jump level, extended by reading non-jumpable edges inside of the
+        level: `nonjump_closure[source, target]` is set iff target can be
+        reached from source with a non-empty path of non-jumpable edges.
         '''
-        # Register non-jumpable transitions inside next level
-        for source in self.levelset.vertices[level]:
-            for target in nonjump_adj[source]:
-                if (target, level) not in self.jl:
-                    self.levelset.register(target, level)
+        extension = nonjump_closure[targets].any(axis=0)
 
-                self.nonjump_vertices.add((target, level))
+        if coreachable is not None:
+            extension &= coreachable
+
+        # Levels are usually small, they are built from masks over all states
+        # rather than with set operations on arrays of vertices
+        members = extension.copy()
+        members[targets] = True
+        vertices = numpy.flatnonzero(members)
+        self.levelset.register_level(level, vertices, is_sorted=True)
+        self.dirty.add(level)
+
+        jl = numpy.full(len(members), -1, dtype=VERTEX)
+        jl[targets] = targets_jl
+        self.jl[level] = jl[vertices]
+        self.nonjump_vertices = extension[vertices]
 
     @benchmark.track
-    def compute_reach(self, level, jump_adj):
+    def compute_reach(self, level, jump_table):
         '''
         Compute reach and rlevel, that is the effective jump points to all
         levels reachable from the current level.
         '''
         # Update rlevel
-        self.rlevel[level] = {self.jl[vertex, level]
-                              for vertex in self.levelset.vertices[level]
-                              if (vertex, level) in self.jl}
+        self.rlevel[level] = set(self.jl[level].tolist()) - {-1}
         self.rev_rlevel[level] = set()
 
         for sublevel in self.rlevel[level]:
@@ -114,23 +137,17 @@ class Jump:
         # Update reach
         prev_level = level - 1
 
-        shape = (len(self.levelset.vertices[prev_level]),
-                 len(self.levelset.vertices[level]))
-        self.reach[prev_level, level] = numpy.zeros(shape, dtype=bool)
-
-        for source in self.levelset.vertices[prev_level]:
-            for target in jump_adj[source]:
-                id_source = self.levelset.vertex_index[prev_level][source]
-                id_target = self.levelset.vertex_index[level][target]
-                self.reach[prev_level, level][id_source, id_target] = True
+        adjacency = jump_table[self.levelset.vertices[prev_level]][
+            :, self.levelset.vertices[level]]
+        self.reach[prev_level, level] = matrix.from_dense(adjacency)
 
         for sublevel in self.rlevel[level]:
             if sublevel >= prev_level:
                 continue
 
-            self.reach[sublevel, level] = numpy.dot(
-                self.reach[sublevel, prev_level],
-                self.reach[prev_level, level])
+            self.reach[sublevel, level] = matrix.compact(
+                self.reach[sublevel, prev_level]
+                @ self.reach[prev_level, level])
 
         if prev_level not in self.rlevel[level]:
             del self.reach[prev_level, level]
@@ -150,81 +167,89 @@ class Jump:
         level to nodes of its sublevel. The vertices given as input shall be
         represented by their index in `self.levelset.vertices[level]`.
         '''
-        if vertices is None:
-            return numpy.sum(self.reach[sublevel, level], axis=1)
+        return self.reach[sublevel, level].count_rows(vertices)
 
-        return numpy.sum(self.reach[sublevel, level][:, vertices], axis=1)
-
-    @benchmark.track
-    def clean_level(self, level, adj):
+    def level_nbytes(self, level) -> int:
         '''
-        Remove all useless nodes inside current level. A useless node is a node
-        from which there is no path of assignation to a node which can be
-        jumped to.
+        Number of bytes used to store a level, including the reach matrices
+        from and to this level.
         '''
         if level not in self.levelset.vertices:
-            return False
+            return 0
 
-        if level == 0:
-            return False  # TODO: fix the reach[0, 0] exception
+        ret = self.levelset.vertices[level].nbytes + self.jl[level].nbytes
 
-        # Run over the level and eliminate all path that are not usefull ie.
-        # paths that don't access to a jumpable vertex
-        with benchmark.track_block('clean: select vertices'):
-            seen = set()
-            lvl_vertices = set(self.levelset.vertices[level])
-            del_vertices = set(self.levelset.vertices[level])
+        if self.count_ingoing_jumps is not None:
+            ret += self.count_ingoing_jumps[level].nbytes
+
+        ret += sum(self.reach[sublevel, level].nbytes
+                   for sublevel in self.rlevel[level])
+        ret += sum(self.reach[level, uplevel].nbytes
+                   for uplevel in self.rev_rlevel[level])
+        return ret
+
+    def nbytes(self) -> int:
+        '''
+        Number of bytes used to store the levels and reach matrices.
+        '''
+        ret = sum(reach.nbytes for reach in self.reach.values())
+
+        for level, vertices in self.levelset.vertices.items():
+            ret += vertices.nbytes + self.jl[level].nbytes
 
-            for start in self.levelset.vertices[level]:
-                if start in seen:
-                    continue
+            if self.count_ingoing_jumps is not None:
+                ret += self.count_ingoing_jumps[level].nbytes
 
-                heap = [(start, [start])]
+        return ret
 
-                while heap:
-                    source, path = heap.pop()
-                    source_id = self.levelset.vertex_index[level][source]
-                    seen.add(source)
+    @benchmark.track
+    def clean_level(self, level, nonjump_closure):
+        '''
+        Remove all useless nodes inside current level. A useless node is a node
+        from which there is no path of assignation to a node which can be
+        jumped to. Returns the number of bytes reclaimed.
+        '''
+        if level not in self.levelset.vertices:
+            return 0
 
-                    # If the path can be identified as usefull, remove it from the
-                    # set of vertices to delete
-                    usefull_path = (
-                        self.count_ingoing_jumps[level][source_id] > 0
-                        or any(vertex not in del_vertices
-                               for vertex in adj[source] if vertex in lvl_vertices))
+        if level == 0:
+            return 0  # TODO: fix the reach[0, 0] exception
 
-                    if usefull_path:
-                        for vertex in path:
-                            if vertex in del_vertices:
-                                del_vertices.remove(vertex)
+        # Vertices of a level can only become useless when they lose ingoing
+        # jumps, which marks the level as dirty
+        if level not in self.dirty:
+            return 0
 
-                        path = []
+        self.dirty.discard(level)
 
-                    for target in adj[source]:
-                        if target in lvl_vertices and target not in seen:
-                            assert target in del_vertices
-                            target_path = path.copy()
-                            target_path.append(target)
-                            heap.append((target, target_path))
+        # Eliminate all vertices that are not usefull ie. vertices that don't
+        # access to a jumpable vertex
+        with benchmark.track_block('clean: select vertices'):
+            vertices = self.levelset.vertices[level]
+            jumpable = self.count_ingoing_jumps[level] > 0
+            closure = nonjump_closure[vertices][:, vertices[jumpable]]
+            kept = jumpable | closure.any(axis=1)
 
-            if not del_vertices:
-                return False
+            if kept.all():
+                return 0
 
-        removed_columns = [self.levelset.vertex_index[level][x]
-                           for x in del_vertices]
+            removed_columns = numpy.flatnonzero(~kept)
 
         # Apply deletion
         with benchmark.track_block('clean: apply'):
-            self.levelset.remove_from_level(level, del_vertices)
+            size = self.level_nbytes(level)
 
-            for vertex in del_vertices:
-                if (vertex, level) in self.jl:
-                    del self.jl[vertex, level]
+            self.levelset.remove_from_level(level, removed_columns)
+            self.jl[level] = self.jl[level][kept]
+
+            if level == self.last_level:
+                self.nonjump_vertices = self.nonjump_vertices[kept]
 
             if level not in self.levelset.vertices:
                 for sublevel in self.rlevel[level]:
                     self.count_ingoing_jumps[sublevel] -= (
                         self.count_inbetween_jumps(None, level, sublevel))
+                    self.dirty.add(sublevel)
                     del self.reach[sublevel, level]
 
                 for uplevel in self.rev_rlevel[level]:
@@ -234,14 +259,13 @@ class Jump:
                 for sublevel in self.rlevel[level]:
                     self.rev_rlevel[sublevel].remove(level)
 
+                del self.jl[level]
                 del self.rlevel[level]
                 del self.rev_rlevel[level]
                 del self.count_ingoing_jumps[level]
             else:
                 # Update rlevel
-                new_rlevel = {self.jl[vertex, level]
-                              for vertex in self.levelset.vertices[level]
-                              if (vertex, level) in self.jl}
+                new_rlevel = set(self.jl[level].tolist()) - {-1}
 
                 # Update jump counters to sublevels, if a sublevel is removed
                 # from rlevel, then we need to remove jump pointers from any
@@ -249,11 +273,13 @@ class Jump:
                 for sublevel in self.rlevel[level] - new_rlevel:
                     self.count_ingoing_jumps[sublevel] -= (
                         self.count_inbetween_jumps(None, level, sublevel))
+                    self.dirty.add(sublevel)
 
                 for sublevel in new_rlevel:
                     self.count_ingoing_jumps[sublevel] -= (
                         self.count_inbetween_jumps(removed_columns, level,
                                                    sublevel))
+                    self.dirty.add(sublevel)
 
                 # Remove deprecated links in reach and rlevel
                 for sublevel in self.rlevel[level] - new_rlevel:
@@ -263,46 +289,149 @@ class Jump:
                 self.rlevel[level] = new_rlevel
 
                 # Update reach
-                self.count_ingoing_jumps[level] = numpy.delete(
-                    self.count_ingoing_jumps[level], removed_columns)
+                self.count_ingoing_jumps[level] = (
+                    self.count_ingoing_jumps[level][kept])
 
                 for uplevel in self.rev_rlevel[level]:
-                    self.reach[level, uplevel] = numpy.delete(
-                        self.reach[level, uplevel], removed_columns, axis=0)
+                    self.reach[level, uplevel] = (
+                        self.reach[level, uplevel].delete_rows(removed_columns))
 
                 for sublevel in self.rlevel[level]:
-                    self.reach[sublevel, level] = numpy.delete(
-                        self.reach[sublevel, level], removed_columns, axis=1)
+                    self.reach[sublevel, level] = (
+                        self.reach[sublevel, level].delete_columns(
+                            removed_columns))
 
-        return True
+        return size - self.level_nbytes(level)
 
     def __call__(self, level, gamma):
         '''
         Jump to the next relevel level from vertices in gamma at a given level.
         A relevent level has a node from which there is a path to gamma and
         that has an ingoing assignation.
+
+        The set gamma is given as a boolean mask over states, and the
+        vertices of the reached level are returned in the same form.
         '''
         i = level
-        j = max((self.jl[vertex, level]
-                 for vertex in gamma
-                 if (vertex, level) in self.jl), default=None)
+        vertices = self.levelset.vertices[level]
+        sources = gamma[vertices] & (self.jl[level] >= 0)
+        ret = numpy.zeros(len(gamma), dtype=bool)
 
-        if j is None:
-            return j, []
+        if not sources.any():
+            return None, ret
+
+        j = int(self.jl[level][sources].max())
 
         if i == j:
             assert i == 0
-            return j, []
+            return j, ret
+
+        targets = self.reach[j, i].rows_hitting(numpy.flatnonzero(sources))
+        ret[self.levelset.vertices[j][targets]] = True
+        return j, ret
+
+    def to_arrays(self) -> dict:
+        '''
+        Export the structure required to perform jumps as a dictionary of
+        flat arrays, from which it can be rebuilt with `from_arrays`.
+        '''
+        levels = sorted(self.levelset.vertices)
+        level_sizes = [len(self.levelset.vertices[level]) for level in levels]
+        reach_keys = sorted(self.reach)
+        bits = [self.reach[key] for key in reach_keys
+                if not isinstance(self.reach[key], SparseMatrix)]
+        sparse = [self.reach[key] for key in reach_keys
+                  if isinstance(self.reach[key], SparseMatrix)]
+
+        return {
+            'levels': numpy.array(levels, dtype=numpy.int64),
+            'level_offsets': numpy.cumsum([0] + level_sizes, dtype=numpy.int64),
+            'vertices': concatenate(
+                [self.levelset.vertices[level] for level in levels], VERTEX),
+            'jl': concatenate([self.jl[level] for level in levels], VERTEX),
+            'reach_keys': numpy.array(reach_keys, dtype=numpy.int64)
+                          .reshape(-1, 2),
+            'reach_cols': numpy.array([self.reach[key].nb_cols
+                                       for key in reach_keys],
+                                      dtype=numpy.int64),
+            'reach_sparse': numpy.array(
+                [isinstance(self.reach[key], SparseMatrix)
+                 for key in reach_keys], dtype=bool),
+            'reach_words_offsets': numpy.cumsum(
+                [0] + [reach.words.size for reach in bits], dtype=numpy.int64),
+            'reach_words': concatenate([reach.words.ravel()
+                                        for reach in bits], WORD),
+            'reach_indices_offsets': numpy.cumsum(
+                [0] + [reach.indices.size for reach in sparse],
+                dtype=numpy.int64),
+            'reach_indptr': concatenate([reach.indptr for reach in sparse],
+                                        numpy.int64),
+            'reach_indices': concatenate([reach.indices for reach in sparse],
+                                         numpy.int32),
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays: dict):
+        '''
+        Rebuild a structure exported with `to_arrays`, the arrays are used
+        without copy. The result can be used to perform jumps but can't be
+        extended with new levels.
+        '''
+        ret = cls.__new__(cls)
+        ret.levelset = LevelSet()
+        ret.jl = dict()
+        ret.reach = dict()
+        ret.nonjump_vertices = None
+        ret.count_ingoing_jumps = None
+        ret.dirty = set()
+
+        levels = arrays['levels'].tolist()
+        offsets = arrays['level_offsets'].tolist()
+        ret.last_level = max(levels)
+        ret.rlevel = {level: set() for level in levels}
+        ret.rev_rlevel = {level: set() for level in levels}
+
+        for level, start, end in zip(levels, offsets, offsets[1:]):
+            ret.levelset.vertices[level] = arrays['vertices'][start:end]
+            ret.jl[level] = arrays['jl'][start:end]
+
+        words_offsets = iter(arrays['reach_words_offsets'].tolist())
+        indices_offsets = iter(arrays['reach_indices_offsets'].tolist())
+        words_start = next(words_offsets)
+        indices_start = next(indices_offsets)
+        indptr_start = 0
+
+        for (sublevel, level), nb_cols, sparse in zip(
+                arrays['reach_keys'].tolist(), arrays['reach_cols'].tolist(),
+                arrays['reach_sparse'].tolist()):
+            nb_rows = len(ret.levelset.vertices[sublevel])
+
+            if sparse:
+                # The row pointers of each matrix are stored relative to its
+                # own array of indices
+                indices_end = next(indices_offsets)
+                ret.reach[sublevel, level] = SparseMatrix(
+                    arrays['reach_indptr'][indptr_start:
+                                           indptr_start + nb_rows + 1],
+                    arrays['reach_indices'][indices_start:indices_end],
+                    nb_cols)
+                indptr_start += nb_rows + 1
+                indices_start = indices_end
+            else:
+                words_end = next(words_offsets)
+                words = arrays['reach_words'][words_start:words_end].reshape(
+                    nb_rows, nb_words(nb_cols))
+                ret.reach[sublevel, level] = BitMatrix(words, nb_cols)
+                words_start = words_end
+
+            ret.rlevel[level].add(sublevel)
+            ret.rev_rlevel[sublevel].add(level)
 
-        gamma2 = []
+        return ret
 
-        for l, target in enumerate(self.levelset.vertices[j]):
-            for source in gamma:
-                if (source, level) in self.jl:
-                    k = self.levelset.vertex_index[level][source]
 
-                    if self.reach[j, i][l, k]:
-                        gamma2.append(target)
-                        break
+def concatenate(arrays: list, dtype) -> numpy.ndarray:
+    if not arrays:
+        return numpy.zeros(0, dtype=dtype)
 
-        return j, gamma2
+    return numpy.concatenate(arrays).astype(dtype, copy=False)
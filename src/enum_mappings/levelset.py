@@ -1,53 +1,41 @@
+import numpy
+
+
+# Type used to store vertices
+VERTEX = numpy.int32
+
+
 class LevelSet:
     '''
     Represent the partitioning into levels of a product graph.
 
     A same vertex can be store in several levels, and this level hierarchy can
-    be accessed rather efficiently.
+    be accessed rather efficiently. The vertices of a level are stored in a
+    sorted array.
     '''
     def __init__(self):
-        # Index level -> vertices list
+        # Index level -> sorted array of vertices
         self.vertices = dict()
-        # Index of a vertex in its level
-        self.vertex_index = dict()
 
-    def register(self, vertex, level: int):
+    def register_level(self, level: int, vertices, is_sorted: bool = False):
         '''
-        Save a given vertex in a level, the vertex need to be unique inside
-        this level but can be registered in other levels.
+        Save the given vertices as the content of a level, a vertex can be
+        registered in several levels. Sorting is skipped if the vertices are
+        known to be `is_sorted` without duplicates.
         '''
-        if level not in self.vertices:
-            self.vertices[level] = []
-            self.vertex_index[level] = dict()
-
-        if vertex not in self.vertex_index[level]:
-            self.vertices[level].append(vertex)
-            self.vertex_index[level][vertex] = len(self.vertices[level]) - 1
+        vertices = numpy.asarray(vertices, dtype=VERTEX)
+        self.vertices[level] = vertices if is_sorted else numpy.unique(vertices)
 
-    def remove_from_level(self, level: int, del_vertices: set):
+    def remove_from_level(self, level: int, removed):
         '''
-        Remove a set of vertices from a level, if the level is left empty, it
-        is then removed.
+        Remove a set of vertices, given by their index, from a level. If the
+        level is left empty, it is then removed.
         '''
-        new_vertices = []
+        kept = numpy.ones(len(self.vertices[level]), dtype=bool)
+        kept[removed] = False
+        kept = self.vertices[level][kept]
 
-        for old_vertex in self.vertices[level]:
-            if old_vertex not in del_vertices:
-                new_vertices.append(old_vertex)
-                self.vertex_index[level][old_vertex] = len(new_vertices) - 1
-            else:
-                del self.vertex_index[level][old_vertex]
-
-        if new_vertices:
-            self.vertices[level] = new_vertices
+        if kept.size:
+            self.vertices[level] = kept
         else:
-            del self.vertex_index[level]
-            del self.vertices[level]
-
-    def remove_level(self, level: int):
-        '''
-        Remove all vertices registered in a level, the level is the removed.
-        '''
-        if level in self.vertices:
             del self.vertices[level]
-            del self.vertex_index[level]
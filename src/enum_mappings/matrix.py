@@ -0,0 +1,360 @@
+import numpy
+
+
+# Type of the words used to pack rows of a matrix
+WORD = numpy.dtype('<u8')
+WORD_BITS = 64
+
+# Maximal number of cells of the left operand unpacked at once while
+# computing a product
+PRODUCT_BLOCK_SIZE = 1 << 14
+# Maximal number of words selected at once in products computed by broadcast,
+# which is cheaper for the small matrices of most levels
+SMALL_PRODUCT_SIZE = 1 << 12
+
+# Matrices with a lower density of cells set are stored as sparse matrices
+SPARSE_DENSITY = 1 / 64
+# Matrices with fewer cells are always stored as bit-packed matrices
+SPARSE_MIN_SIZE = 1 << 12
+
+
+def nb_words(nb_cols: int) -> int:
+    '''
+    Number of words required to store a row of `nb_cols` bits.
+    '''
+    return (nb_cols + WORD_BITS - 1) // WORD_BITS
+
+
+def pack(dense) -> numpy.ndarray:
+    '''
+    Pack the rows of a 2D boolean array into words.
+    '''
+    nb_rows, nb_cols = dense.shape
+    ret = numpy.zeros((nb_rows, nb_words(nb_cols) * WORD.itemsize),
+                      dtype=numpy.uint8)
+    packed = numpy.packbits(dense, axis=1, bitorder='little')
+    ret[:, :packed.shape[1]] = packed
+    return ret.view(WORD)
+
+
+def unpack(words, nb_cols: int) -> numpy.ndarray:
+    '''
+    Unpack words obtained with `pack` into a 2D boolean array.
+    '''
+    bits = numpy.unpackbits(words.view(numpy.uint8), axis=1,
+                            count=nb_cols, bitorder='little')
+    return bits.astype(bool)
+
+
+def popcount(words) -> numpy.ndarray:
+    '''
+    Count the number of bits set in each row of a 2D array of words.
+    '''
+    if hasattr(numpy, 'bitwise_count'):
+        return numpy.bitwise_count(words).sum(axis=1, dtype=int)
+
+    bits = numpy.unpackbits(words.view(numpy.uint8), axis=1)
+    return bits.sum(axis=1, dtype=int)
+
+
+class BitMatrix:
+    '''
+    Boolean matrix with rows packed into 64-bits words.
+
+    The product of two matrices is a boolean product, computed as an OR of the
+    rows of the right operand selected by the left operand, which allows to
+    process 64 columns at once.
+    '''
+    def __init__(self, words, nb_cols: int):
+        self.words = words
+        self.nb_cols = nb_cols
+
+    @classmethod
+    def from_dense(cls, dense):
+        return cls(pack(numpy.asarray(dense, dtype=bool)), dense.shape[1])
+
+    @classmethod
+    def zeros(cls, nb_rows: int, nb_cols: int):
+        return cls(numpy.zeros((nb_rows, nb_words(nb_cols)), dtype=WORD),
+                   nb_cols)
+
+    @property
+    def shape(self):
+        return self.words.shape[0], self.nb_cols
+
+    @property
+    def nbytes(self):
+        return self.words.nbytes
+
+    @property
+    def nnz(self):
+        return int(self.count_rows().sum())
+
+    def to_dense(self):
+        return unpack(self.words, self.nb_cols)
+
+    def to_bits(self):
+        return self
+
+    def column_mask(self, columns) -> numpy.ndarray:
+        '''
+        Get the packed row selecting the given list of column indices.
+        '''
+        mask = numpy.zeros((1, self.nb_cols), dtype=bool)
+        mask[0, columns] = True
+        return pack(mask)[0]
+
+    def count_rows(self, columns=None) -> numpy.ndarray:
+        '''
+        Count the number of cells set in each row, if `columns` is specified,
+        only cells from this list of columns are counted.
+        '''
+        if columns is None:
+            return popcount(self.words)
+
+        return popcount(self.words & self.column_mask(columns))
+
+    def rows_hitting(self, columns) -> numpy.ndarray:
+        '''
+        Get the mask of rows having a cell set in one of the given columns,
+        which is computed with a single OR over the words of each row.
+        '''
+        mask = self.column_mask(columns)
+        return numpy.bitwise_or.reduce(self.words & mask, axis=1) != 0
+
+    def delete_rows(self, rows):
+        kept = numpy.ones(self.words.shape[0], dtype=bool)
+        kept[rows] = False
+        return BitMatrix(self.words[kept], self.nb_cols)
+
+    def delete_columns(self, columns):
+        '''
+        Remove a list of columns, each run of consecutive kept columns is
+        shifted to its new position word by word.
+        '''
+        runs = []
+        start = 0
+
+        for column in sorted(set(numpy.asarray(columns).tolist())):
+            if column > start:
+                runs.append((start, column))
+
+            start = column + 1
+
+        if start < self.nb_cols:
+            runs.append((start, self.nb_cols))
+
+        nb_cols = sum(end - start for start, end in runs)
+        ret = numpy.zeros((self.words.shape[0], nb_words(nb_cols)), dtype=WORD)
+        dest = 0
+
+        for start, end in runs:
+            quotient, remainder = divmod(start - dest, WORD_BITS)
+            dest_end = dest + end - start
+
+            for word in range(dest // WORD_BITS,
+                              (dest_end - 1) // WORD_BITS + 1):
+                low = max(dest - word * WORD_BITS, 0)
+                high = min(dest_end - word * WORD_BITS, WORD_BITS)
+                mask = WORD.type(((1 << high) - 1) ^ ((1 << low) - 1))
+                source = word + quotient
+                value = self.words[:, source] >> WORD.type(remainder)
+
+                if remainder and source + 1 < self.words.shape[1]:
+                    value |= self.words[:, source + 1] \
+                        << WORD.type(WORD_BITS - remainder)
+
+                ret[:, word] |= value & mask
+
+            dest = dest_end
+
+        return BitMatrix(ret, nb_cols)
+
+    def __getitem__(self, cell):
+        row, col = cell
+        word = self.words[row, col // WORD_BITS]
+        return bool((int(word) >> (col % WORD_BITS)) & 1)
+
+    def __matmul__(self, other):
+        assert self.nb_cols == other.shape[0]
+        other = other.to_bits()
+
+        if self.shape[0] * other.words.shape[0] * other.words.shape[1] \
+                <= SMALL_PRODUCT_SIZE:
+            selected = numpy.where(
+                unpack(self.words, self.nb_cols)[:, :, numpy.newaxis],
+                other.words, WORD.type(0))
+            return BitMatrix(numpy.bitwise_or.reduce(selected, axis=1),
+                             other.nb_cols)
+
+        ret = BitMatrix.zeros(self.shape[0], other.nb_cols)
+
+        # Each row of the result is the OR of the packed rows of the right
+        # operand selected by the bits set in the row of the left operand,
+        # rows of the left operand are unpacked by blocks to bound memory usage
+        block = max(1, PRODUCT_BLOCK_SIZE // max(1, self.nb_cols))
+
+        for start in range(0, self.shape[0], block):
+            rows, cols = numpy.nonzero(unpack(self.words[start:start+block],
+                                              self.nb_cols))
+
+            if not rows.size:
+                continue
+
+            firsts = numpy.flatnonzero(rows[1:] != rows[:-1]) + 1
+            firsts = numpy.concatenate(([0], firsts))
+            ret.words[start + rows[firsts]] = numpy.bitwise_or.reduceat(
+                other.words[cols], firsts, axis=0)
+
+        return ret
+
+
+class SparseMatrix:
+    '''
+    Boolean matrix stored in compressed sparse row format: the indices of
+    columns set in the i-th row are `indices[indptr[i]:indptr[i+1]]`, sorted
+    in increasing order.
+    '''
+    def __init__(self, indptr, indices, nb_cols: int):
+        self.indptr = indptr
+        self.indices = indices
+        self.nb_cols = nb_cols
+
+    @classmethod
+    def from_dense(cls, dense):
+        dense = numpy.asarray(dense, dtype=bool)
+        rows, cols = numpy.nonzero(dense)
+        return cls.from_cells(dense.shape, rows, cols)
+
+    @classmethod
+    def from_cells(cls, shape, rows, cols):
+        '''
+        Build a matrix from the list of cells set, sorted by rows.
+        '''
+        counts = numpy.bincount(rows, minlength=shape[0])
+        indptr = numpy.zeros(shape[0] + 1, dtype=numpy.int64)
+        numpy.cumsum(counts, out=indptr[1:])
+        return cls(indptr, numpy.asarray(cols, dtype=numpy.int32), shape[1])
+
+    @property
+    def shape(self):
+        return len(self.indptr) - 1, self.nb_cols
+
+    @property
+    def nbytes(self):
+        return self.indptr.nbytes + self.indices.nbytes
+
+    @property
+    def nnz(self):
+        return len(self.indices)
+
+    def row_ids(self) -> numpy.ndarray:
+        '''
+        Get the row of each cell set in the matrix.
+        '''
+        return numpy.repeat(numpy.arange(self.shape[0]),
+                            numpy.diff(self.indptr))
+
+    def to_dense(self):
+        ret = numpy.zeros(self.shape, dtype=bool)
+        ret[self.row_ids(), self.indices] = True
+        return ret
+
+    def to_bits(self):
+        return BitMatrix.from_dense(self.to_dense())
+
+    def count_rows(self, columns=None) -> numpy.ndarray:
+        '''
+        Count the number of cells set in each row, if `columns` is specified,
+        only cells from this list of columns are counted.
+        '''
+        if columns is None:
+            return numpy.diff(self.indptr).astype(int)
+
+        selected = numpy.zeros(self.nb_cols, dtype=bool)
+        selected[columns] = True
+        hits = selected[self.indices]
+        return numpy.bincount(self.row_ids()[hits], minlength=self.shape[0])
+
+    def rows_hitting(self, columns) -> numpy.ndarray:
+        '''
+        Get the mask of rows having a cell set in one of the given columns.
+        '''
+        selected = numpy.zeros(self.nb_cols, dtype=bool)
+        selected[columns] = True
+        ret = numpy.zeros(self.shape[0], dtype=bool)
+        ret[self.row_ids()[selected[self.indices]]] = True
+        return ret
+
+    def delete_rows(self, rows):
+        kept = numpy.ones(self.shape[0], dtype=bool)
+        kept[rows] = False
+        kept_cells = numpy.repeat(kept, numpy.diff(self.indptr))
+        return SparseMatrix.from_cells(
+            (int(kept.sum()), self.nb_cols),
+            numpy.cumsum(kept)[self.row_ids()[kept_cells]] - 1,
+            self.indices[kept_cells])
+
+    def delete_columns(self, columns):
+        kept = numpy.ones(self.nb_cols, dtype=bool)
+        kept[columns] = False
+        new_index = numpy.cumsum(kept) - 1
+        kept_cells = kept[self.indices]
+        return SparseMatrix.from_cells(
+            (self.shape[0], int(kept.sum())),
+            self.row_ids()[kept_cells],
+            new_index[self.indices[kept_cells]])
+
+    def __getitem__(self, cell):
+        row, col = cell
+        start, end = self.indptr[row], self.indptr[row + 1]
+        pos = start + numpy.searchsorted(self.indices[start:end], col)
+        return bool(pos < end and self.indices[pos] == col)
+
+    def __matmul__(self, other):
+        assert self.nb_cols == other.shape[0]
+
+        if not isinstance(other, SparseMatrix):
+            return self.to_bits() @ other
+
+        # For each cell (i, k) of the left operand, list the cells (i, j) of
+        # the right operand's row k
+        starts = other.indptr[self.indices]
+        lengths = other.indptr[self.indices + 1] - starts
+        offsets = numpy.repeat(starts - numpy.cumsum(lengths) + lengths,
+                               lengths)
+        cols = other.indices[offsets + numpy.arange(lengths.sum())]
+        rows = numpy.repeat(self.row_ids(), lengths)
+
+        cells = numpy.unique(rows.astype(numpy.int64) * other.nb_cols + cols)
+        return SparseMatrix.from_cells((self.shape[0], other.nb_cols),
+                                       cells // max(1, other.nb_cols),
+                                       cells % max(1, other.nb_cols))
+
+
+def from_dense(dense):
+    '''
+    Build a matrix from a 2D boolean array, choosing the representation
+    depending on its density.
+    '''
+    if dense.size >= SPARSE_MIN_SIZE \
+            and numpy.count_nonzero(dense) < SPARSE_DENSITY * dense.size:
+        return SparseMatrix.from_dense(dense)
+
+    return BitMatrix.from_dense(dense)
+
+
+def compact(matrix):
+    '''
+    Convert a matrix to the representation fitting its density.
+    '''
+    size = matrix.shape[0] * matrix.shape[1]
+    sparse = size >= SPARSE_MIN_SIZE and matrix.nnz < SPARSE_DENSITY * size
+
+    if sparse and not isinstance(matrix, SparseMatrix):
+        return SparseMatrix.from_dense(matrix.to_dense())
+
+    if not sparse and isinstance(matrix, SparseMatrix):
+        return matrix.to_bits()
+
+    return matrix
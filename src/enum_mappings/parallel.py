@@ -0,0 +1,257 @@
+import queue
+import traceback
+
+from va import VA
+
+
+# Automaton used by the worker processes, set by `init_worker`
+WORKER_VA = None
+
+# Maximal number of batches of mappings waiting to be consumed
+QUEUE_SIZE = 64
+# Number of mappings sent at once by enumeration workers
+BATCH_SIZE = 256
+# Number of frames handed to each worker by the ordered enumeration
+FRAMES_PER_WORKER = 4
+# Maximal number of rounds of expansion of frames before the ordered
+# enumeration hands frames to workers
+EXPANSION_ROUNDS = 16
+# Delay in seconds between checks that workers are still alive
+POLL_INTERVAL = 0.1
+
+
+class WorkerError(Exception):
+    pass
+
+
+def init_worker(va: VA):
+    global WORKER_VA  #pylint: disable=global-statement
+    WORKER_VA = va
+
+
+def receive(results, processes):
+    '''
+    Get the next message sent by worker processes through a queue. Raise a
+    `WorkerError` if a worker sent an error or exited abnormally.
+    '''
+    while True:
+        try:
+            kind, content = results.get(timeout=POLL_INTERVAL)
+        except queue.Empty:
+            if any(process.exitcode not in (None, 0) for process in processes):
+                raise WorkerError('a worker process exited unexpectedly')
+
+            continue
+
+        if kind == 'error':
+            raise WorkerError(content)
+
+        return kind, content
+
+
+def steal_frames(dag, tasks, results, idle, pending):
+    '''
+    Enumeration worker: expand frames taken from the shared queue of tasks
+    until it receives `None`. A worker runs the enumeration of a frame on its
+    own stack, but hands the oldest frame of its stack back to the queue
+    whenever another worker is idle.
+
+    The shared counter `pending` holds the number of frames that are not
+    fully expanded, the worker bringing it to zero reports that the
+    enumeration is finished.
+    '''
+    try:
+        while True:
+            with idle.get_lock():
+                idle.value += 1
+
+            frame = tasks.get()
+
+            with idle.get_lock():
+                idle.value -= 1
+
+            if frame is None:
+                results.put(('stopped', []))
+                return
+
+            stack = [frame]
+            batch = []
+
+            while stack:
+                mappings, children = dag.expand_frame(*stack.pop())
+                batch.extend(mappings)
+                stack.extend(children)
+
+                if len(batch) >= BATCH_SIZE:
+                    results.put(('mappings', batch))
+                    batch = []
+
+                if len(stack) > 1 and idle.value > 0:
+                    with pending.get_lock():
+                        pending.value += 1
+
+                    tasks.put(stack.pop(0))
+
+            results.put(('mappings', batch))
+
+            with pending.get_lock():
+                pending.value -= 1
+                finished = pending.value == 0
+
+            if finished:
+                results.put(('finished', []))
+    except Exception:  #pylint: disable=broad-except
+        results.put(('error', traceback.format_exc()))
+
+
+def enumerate_unordered(dag, workers: int, queue_size: int = QUEUE_SIZE):
+    '''
+    Iterate over the mappings of a DAG using a pool of forked processes that
+    steal frames from each other, mappings are output in no specific order.
+    '''
+    import multiprocessing  #pylint: disable=import-outside-toplevel
+    context = multiprocessing.get_context('fork')
+    tasks = context.Queue()
+    results = context.Queue(queue_size)
+    idle = context.Value('i', 0)
+    pending = context.Value('i', 1)
+    processes = [context.Process(target=steal_frames,
+                                 args=(dag, tasks, results, idle, pending),
+                                 daemon=True)
+                 for _ in range(workers)]
+
+    for process in processes:
+        process.start()
+
+    try:
+        tasks.put(dag.root_frame())
+        stopped = 0
+
+        # Once the enumeration is finished, workers are stopped and the
+        # mappings they sent before stopping are still consumed
+        while stopped < workers:
+            kind, mappings = receive(results, processes)
+            yield from mappings
+
+            if kind == 'finished':
+                for _ in processes:
+                    tasks.put(None)
+            elif kind == 'stopped':
+                stopped += 1
+
+        for process in processes:
+            process.join()
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+
+def enumerate_subtrees(dag, frames, results):
+    '''
+    Ordered enumeration worker: fully enumerate a list of frames in order.
+    Mappings are sent by batches, and a message `'done'` is sent when a frame
+    is done.
+    '''
+    try:
+        for frame in frames:
+            batch = []
+
+            for mapping in dag.enumerate_frames([frame]):
+                batch.append(mapping)
+
+                if len(batch) >= BATCH_SIZE:
+                    results.put(('mappings', batch))
+                    batch = []
+
+            results.put(('mappings', batch))
+            results.put(('done', []))
+    except Exception:  #pylint: disable=broad-except
+        results.put(('error', traceback.format_exc()))
+
+
+def expand_items(dag, items: list, workers: int):
+    '''
+    Expand in sequence the frames of a sequence of outputs of the enumeration,
+    made of mappings and of frames, until there are enough frames to share
+    between workers or after `EXPANSION_ROUNDS` rounds. Mappings preceding
+    the first frame are yielded as soon as they are found, the remaining
+    items are returned.
+    '''
+    for _ in range(EXPANSION_ROUNDS):
+        first_frame = next((index for index, (kind, _) in enumerate(items)
+                            if kind == 'frame'), len(items))
+
+        for _, mapping in items[:first_frame]:
+            yield mapping
+
+        items = items[first_frame:]
+        nb_frames = sum(kind == 'frame' for kind, _ in items)
+
+        if not nb_frames or nb_frames >= FRAMES_PER_WORKER * workers:
+            break
+
+        expanded = []
+
+        for kind, item in items:
+            if kind == 'frame':
+                mappings, children = dag.expand_frame(*item)
+                expanded.extend(('mapping', mapping) for mapping in mappings)
+                expanded.extend(('frame', child) for child in children[::-1])
+            else:
+                expanded.append((kind, item))
+
+        items = expanded
+
+    return items
+
+
+def enumerate_ordered(dag, workers: int, queue_size: int = QUEUE_SIZE):
+    '''
+    Iterate over the mappings of a DAG using a pool of forked processes, in
+    the same order as the sequential enumeration.
+
+    The first frames are expanded in sequence until there are enough frames
+    to share between workers. Frames are then dealt in turn to the workers,
+    which enumerate them in order. Each worker has its own bounded queue of
+    results which is only read while its current frame is output, so that at
+    most `queue_size` batches per worker are held in memory.
+    '''
+    items = yield from expand_items(dag, [('frame', dag.root_frame())],
+                                    workers)
+    frames = [item for kind, item in items if kind == 'frame']
+    workers = min(workers, len(frames))
+
+    import multiprocessing  #pylint: disable=import-outside-toplevel
+    context = multiprocessing.get_context('fork')
+    queues = [context.Queue(queue_size) for _ in range(workers)]
+    processes = [context.Process(target=enumerate_subtrees,
+                                 args=(dag, frames[worker::workers],
+                                       queues[worker]),
+                                 daemon=True)
+                 for worker in range(workers)]
+
+    for process in processes:
+        process.start()
+
+    try:
+        nb_frames = 0
+
+        for kind, item in items:
+            if kind == 'mapping':
+                yield item
+                continue
+
+            results = queues[nb_frames % workers]
+            nb_frames += 1
+
+            for _, mappings in iter(lambda: receive(results, processes),
+                                    ('done', [])):
+                yield from mappings
+
+        for process in processes:
+            process.join()
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
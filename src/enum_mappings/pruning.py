@@ -0,0 +1,71 @@
+import numpy
+
+from va import VA
+
+
+def step_table(va: VA, char_class: int) -> numpy.ndarray:
+    '''
+    Get the table of the relation between targets of jumpable edges of a
+    level and targets of jumpable edges of the next level, when reading a
+    char of the given class. Both tables are boolean, so that their product
+    is a boolean product.
+    '''
+    table = va.get_table_for_class(char_class)
+    closure = va.get_closure_for_assignations()
+    return table | (closure @ table)
+
+
+class CoreachableLevels:
+    '''
+    Masks of states that can still reach a final state of an automaton at the
+    end of a known document, for each level of its DAG.
+
+    Masks are computed by a backward pass over the classes of chars of the
+    document. As consecutive levels often share the same mask, each distinct
+    mask is only stored once.
+    '''
+    def __init__(self, va: VA, classes):
+        closure = va.get_closure_for_assignations()
+        final = numpy.zeros(va.nb_states, dtype=bool)
+        final[va.final] = True
+
+        # Distinct masks and index of the mask of each level
+        self.masks = [final | closure[:, final].any(axis=1)]
+        self.mask_ids = numpy.empty(len(classes) + 1, dtype=numpy.int32)
+        self.mask_ids[-1] = 0
+
+        ids = {self.masks[0].tobytes(): 0}
+        transitions = dict()
+        steps = dict()
+
+        for level in range(len(classes) - 1, -1, -1):
+            char_class = int(classes[level])
+            key = (char_class, int(self.mask_ids[level + 1]))
+
+            if key not in transitions:
+                if char_class not in steps:
+                    steps[char_class] = step_table(va, char_class)
+
+                mask = steps[char_class][:, self.masks[key[1]]].any(axis=1)
+                transitions[key] = ids.setdefault(mask.tobytes(),
+                                                  len(self.masks))
+
+                if transitions[key] == len(self.masks):
+                    self.masks.append(mask)
+
+            self.mask_ids[level] = transitions[key]
+
+    def __getitem__(self, level: int) -> numpy.ndarray:
+        return self.masks[self.mask_ids[level]]
+
+
+class StaticCoreachable:
+    '''
+    Mask of states that can reach a final state whatever the suffix of the
+    document is, used when the document is not known in advance.
+    '''
+    def __init__(self, va: VA):
+        self.mask = va.get_coreachable()
+
+    def __getitem__(self, level: int) -> numpy.ndarray:
+        return self.mask
@@ -0,0 +1,72 @@
+import json
+import struct
+
+import numpy
+
+
+# Header of files written by `save_arrays`
+MAGIC = b'ENUMDAG\x01'
+# Offsets of arrays inside of the file are multiples of this size
+ALIGNMENT = 64
+
+
+def aligned(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def save_arrays(path, arrays: dict, meta: dict):
+    '''
+    Save a collection of named arrays in a single file, together with some
+    JSON-serializable metadata. The arrays can then be loaded without any
+    copy using `load_arrays`.
+    '''
+    arrays = {name: numpy.ascontiguousarray(array)
+              for name, array in arrays.items()}
+    header = {'meta': meta, 'arrays': dict()}
+    offsets = dict()
+    offset = 0
+
+    for name, array in arrays.items():
+        offsets[name] = offset
+        header['arrays'][name] = {'offset': offset,
+                                  'dtype': array.dtype.str,
+                                  'shape': list(array.shape)}
+        offset += aligned(array.nbytes)
+
+    header = json.dumps(header).encode()
+    data_start = aligned(len(MAGIC) + 8 + len(header))
+
+    with open(path, 'wb') as dest:
+        dest.write(MAGIC)
+        dest.write(struct.pack('<Q', len(header)))
+        dest.write(header)
+
+        for name, array in arrays.items():
+            dest.seek(data_start + offsets[name])
+            array.tofile(dest)
+
+
+def load_arrays(path):
+    '''
+    Load arrays saved with `save_arrays` as read-only views over a memory map
+    of the file. Returns the metadata and the dictionary of arrays.
+    '''
+    with open(path, 'rb') as src:
+        if src.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f'{path} is not a saved DAG')
+
+        header_size, = struct.unpack('<Q', src.read(8))
+        header = json.loads(src.read(header_size))
+
+    data_start = aligned(len(MAGIC) + 8 + header_size)
+    data = numpy.memmap(path, dtype=numpy.uint8, mode='r')
+    arrays = dict()
+
+    for name, desc in header['arrays'].items():
+        dtype = numpy.dtype(desc['dtype'])
+        start = data_start + desc['offset']
+        size = dtype.itemsize * int(numpy.prod(desc['shape']))
+        arrays[name] = (data[start:start+size].view(dtype)
+                        .reshape(desc['shape']))
+
+    return header['meta'], arrays
@@ -0,0 +1,102 @@
+from abc import abstractmethod
+
+import numpy
+
+from enum_mappings.jump import Jump
+
+
+class TrimmingPolicy:
+    '''
+    Decide which levels of a Jump structure are cleaned while it is built.
+
+    The policy is called each time a level is added to the structure, it
+    keeps track of the number of levels that were effectively cleaned and of
+    the number of bytes reclaimed by these cleanups.
+    '''
+    def __init__(self):
+        self.cleanups = 0
+        self.reclaimed = 0
+
+    @abstractmethod
+    def __call__(self, jump: Jump, curr_level: int,
+                 nonjump_closure: numpy.ndarray):
+        '''
+        Clean levels of the structure once the level following `curr_level`
+        has been added, only levels up to `curr_level` can be cleaned.
+        '''
+
+    def clean(self, jump: Jump, level: int,
+              nonjump_closure: numpy.ndarray) -> int:
+        '''
+        Clean a level of the structure and return the number of bytes it
+        reclaimed.
+        '''
+        reclaimed = jump.clean_level(level, nonjump_closure)
+
+        if reclaimed:
+            self.cleanups += 1
+            self.reclaimed += reclaimed
+
+        return reclaimed
+
+    def reset(self):
+        '''
+        Forget what the policy knows about the structure, before it is used
+        for a new one. Statistics are kept.
+        '''
+
+    def stats(self) -> dict:
+        return {'cleanups': self.cleanups, 'reclaimed': self.reclaimed}
+
+
+class ExponentialDepth(TrimmingPolicy):
+    '''
+    Clean the last `2^k` levels, where `2^k` is the greatest power of two
+    dividing the index of the current level.
+    '''
+    def __call__(self, jump, curr_level, nonjump_closure):
+        depth = curr_level & -curr_level
+
+        for level in range(curr_level, curr_level - depth, -1):
+            self.clean(jump, level, nonjump_closure)
+
+
+class MemoryBudget(TrimmingPolicy):
+    '''
+    Only clean levels when the size of the structure exceeds a budget, given
+    in bytes. Levels are then cleaned from the current level downwards until
+    the structure fits again in the budget.
+
+    Only the levels marked as dirty by the structure can be reclaimed, thus
+    levels that were already cleaned are not inspected again while the budget
+    can't be reached.
+    '''
+    def __init__(self, budget: int):
+        super().__init__()
+        self.budget = budget
+        # Size of the structure, updated as levels are added and cleaned
+        self.usage = None
+
+    def reset(self):
+        self.usage = None
+
+    def __call__(self, jump, curr_level, nonjump_closure):
+        if self.usage is None:
+            self.usage = jump.nbytes()
+        else:
+            self.usage += jump.level_nbytes(jump.last_level)
+
+        # Cleaning a level can mark lower levels as dirty, which are cleaned
+        # next
+        inspected = set()
+
+        while self.usage > self.budget:
+            levels = [level for level in jump.dirty
+                      if level <= curr_level and level not in inspected]
+
+            if not levels:
+                return
+
+            level = max(levels)
+            inspected.add(level)
+            self.usage -= self.clean(jump, level, nonjump_closure)
@@ -1,16 +1,22 @@
 #!/usr/bin/python3
 import argparse
+import os
 import signal
 import sys
+from itertools import chain
 from termcolor import cprint
 
 import benchmark
 import regexp
-from enum_mappings import enum_matches
+from document import CHUNK_SIZE, Document
+from enum_mappings import count_matches, enum_matches, record_dag
 
 
 sys.setrecursionlimit(10**4)
 
+# Inputs with at most this number of characters are read as a single string
+STRING_INPUT_SIZE = 1 << 24
+
 # ----- Parse Command Line Arguments -----
 
 parser = argparse.ArgumentParser(
@@ -20,6 +26,7 @@ parser = argparse.ArgumentParser(
 parser.set_defaults(count=False)
 parser.set_defaults(debug=True)
 parser.set_defaults(display_offset=False)
+parser.set_defaults(line_mode=False)
 parser.set_defaults(only_matching=False)
 parser.set_defaults(only_groups=False)
 parser.set_defaults(print=True)
@@ -34,6 +41,11 @@ parser.add_argument(
     'file', type=argparse.FileType('r'), nargs='?', default=sys.stdin,
     help='The file to be read, if none is specified, STDIN is used')
 
+parser.add_argument(
+    '--cache-dir', dest='cache_dir', default=None,
+    help='Directory where compiled patterns are stored and reused by later '
+         'calls.')
+
 parser.add_argument(
     '-b', '--byte-offset', dest='display_offset', action='store_true',
     help='Print the 0-based offset of each matching part and groups.')
@@ -46,6 +58,12 @@ parser.add_argument(
     '-d', '--debug', dest='debug', action='store_true',
     help='Display debug information.')
 
+parser.add_argument(
+    '-l', '--line-mode', dest='line_mode', action='store_true',
+    help='Match each line of the input separately, lines are read and '
+         'matches are printed as the input is streamed. Each match is '
+         'preceded by its line number, offsets are relative to the line.')
+
 parser.add_argument(
     '-o', '--only-matching', dest='only_matching', action='store_true',
     help='Print only the matched (non-empty) parts of a matching line, with '
@@ -75,11 +93,67 @@ args = parser.parse_args()
 
 # ----- Read inputs -----
 
-pattern = regexp.compile(args.regexp)
-document = args.file.read()
+pattern = regexp.compile(args.regexp, args.cache_dir)
+
+
+def read_lines(source):
+    '''
+    Iterate over the lines of the input without their newline, only one line
+    is held in memory at once.
+    '''
+    for line in source:
+        yield line[:-1] if line.endswith('\n') else line
+
+
+def read_input(source):
+    '''
+    Read the input as a string if it holds at most `STRING_INPUT_SIZE`
+    characters, so that the prefilter of the pattern can locate matches in
+    it. Otherwise it is read chunk by chunk as a `Document`, the chunks read
+    ahead are kept for sources that can't be read again.
+    '''
+    if source.seekable():
+        if os.fstat(source.fileno()).st_size > STRING_INPUT_SIZE:
+            return Document(source, strip_newline=True)
+
+        text = source.read()
+    else:
+        text = source.read(STRING_INPUT_SIZE)
+        rest = source.read(CHUNK_SIZE)
+
+        if rest:
+            chunks = chain([text, rest],
+                           iter(lambda: source.read(CHUNK_SIZE), ''))
+            return Document(chunks, strip_newline=True)
+
+    return text[:-1] if text.endswith('\n') else text
 
-if document[-1] == '\n':
-    document = document[:-1]
+
+def print_match(match, prefix: str = ''):
+    print(prefix, end='')
+
+    if args.display_offset or not args.print:
+        print(f'{match.span[0]},{match.span[1]}', end='')
+
+        for name, span in match.group_spans.items():
+            print(f' {name}={span[0]},{span[1]}', end='')
+
+        if args.print:
+            print(': ', end='')
+
+    if args.only_groups:
+        for name in match.group_spans:
+            if match.group(name):
+                print(f'{name}=', end='')
+                cprint(match.group(name), 'red', attrs=['bold', 'dark'],
+                       end=' ')
+
+        print()
+
+    elif args.print:
+        match.pretty_print(args.only_matching)
+    else:
+        print()
 
 
 # ----- Special Actions -----
@@ -94,34 +168,31 @@ if args.show_graph:
 
 # ----- Match The Expression -----
 
-if args.count:
-    print(sum(1 for _ in enum_matches(pattern, document)))
-else:
-    signal.signal(signal.SIGPIPE, signal.SIG_DFL)
-
-    for count, match in enumerate(enum_matches(pattern, document)):
-        if args.display_offset or not args.print:
-            print(f'{match.span[0]},{match.span[1]}', end='')
+signal.signal(signal.SIGPIPE, signal.SIG_DFL)
 
-            for name, span in match.group_spans.items():
-                print(f' {name}={span[0]},{span[1]}', end='')
+if args.line_mode:
+    # A single DAG is reset for each line
+    dag = record_dag(pattern)
+    lines = read_lines(args.file)
 
-            if args.print:
-                print(': ', end='')
+    if args.count:
+        print(sum(count_matches(pattern, line, progress=False, reuse=dag)
+                  for line in lines))
+    else:
+        for line_number, line in enumerate(lines, 1):
+            matches = list(enum_matches(pattern, line, progress=False,
+                                        reuse=dag))
 
-        if args.only_groups:
-            for name in match.group_spans:
-                if match.group(name):
-                    print(f'{name}=', end='')
-                    cprint(match.group(name), 'red', attrs=['bold', 'dark'],
-                           end=' ')
+            for match in matches:
+                print_match(match, f'{line_number}:')
 
-            print()
-
-        elif args.print:
-            match.pretty_print(args.only_matching)
-        else:
-            print()
+            if matches:
+                sys.stdout.flush()
+elif args.count:
+    print(count_matches(pattern, read_input(args.file)))
+else:
+    for match in enum_matches(pattern, read_input(args.file)):
+        print_match(match)
 
 
 # ----- Print Debug Infos -----
@@ -53,19 +53,21 @@ class Match:
         def symbol_print(symbol):
             return f'[{symbol}]'
 
-        display_range = (range(self.span[0], self.span[1] + 1) if only_matching
-                         else range(len(self.document)+1))
+        first, last = (self.span if only_matching
+                       else (0, len(self.document)))
+        display_range = range(first, last + 1)
+        text = self.document[first:last]
 
         for i in display_range:
             symbols[i].sort(key=partial(symbol_order, i))
             cprint(''.join(map(symbol_print, symbols[i])), 'red',
                    attrs=['bold', 'dark'], end='')
 
-            if i < max(display_range):
+            if i < last:
                 if self.span[0] <= i < self.span[1]:
-                    cprint(self.document[i], 'red', attrs=['bold'], end='')
+                    cprint(text[i - first], 'red', attrs=['bold'], end='')
                 elif not only_matching:
-                    cprint(self.document[i], end='')
+                    cprint(text[i - first], end='')
 
         cprint('')
 
@@ -1,14 +1,24 @@
+import copy
+from functools import lru_cache, reduce
+
 from enum_mappings import enum_mappings
+from regexp import cache
 from regexp.ast import EnumerateVariables
+from regexp.literals import ExtractLiterals, Prefilter
 from regexp.parse import parser
 from regexp.glushkov import ASTtoNFA
 from mapping import match_of_mapping
 from va import VA
 
 
-def compile(regexp: str) -> VA:
+# Number of compiled automata kept in memory by `compile`
+COMPILE_CACHE_SIZE = 128
+
+
+def anchors(regexp: str):
     '''
-    Compile a regexp to a non-deterministic variable automata.
+    Remove the anchors ^ and $ surrounding a regexp. Returns the regexp and
+    whether it was anchored to the begining and to the end.
     '''
     # TODO: at least parse ^ and $
     has_strong_begin = False
@@ -22,6 +32,14 @@ def compile(regexp: str) -> VA:
         regexp = regexp[:-1]
         has_strong_end = True
 
+    return regexp, has_strong_begin, has_strong_end
+
+
+def wrap(regexp: str, has_strong_begin: bool, has_strong_end: bool) -> str:
+    '''
+    Make the whole match of a regexp a group `match`, which can be preceded
+    and followed by anything unless the regexp is anchored.
+    '''
     if 'match' not in variables(regexp):
         regexp = f'(?P<match>{regexp})'
 
@@ -31,9 +49,92 @@ def compile(regexp: str) -> VA:
     if not has_strong_end:
         regexp = regexp + '.*'
 
+    return regexp
+
+
+def compile(regexp: str, cache_dir=None) -> VA:
+    '''
+    Compile a regexp to a non-deterministic variable automata. The last
+    compiled automata are kept in memory and each call gets its own copy,
+    which can be altered. If `cache_dir` is specified, automata are also
+    stored in this directory and loaded from it by other processes instead of
+    being compiled again.
+    '''
+    if cache_dir is not None:
+        cache_dir = str(cache_dir)
+
+    automata = copy.copy(compile_cached(regexp, cache_dir))
+    automata.final = list(automata.final)
+    automata.transitions = list(automata.transitions)
+    return automata
+
+
+@lru_cache(COMPILE_CACHE_SIZE)
+def compile_cached(regexp: str, cache_dir: str) -> VA:
+    if cache_dir is None:
+        return build(regexp)
+
+    automata = cache.load(cache_dir, regexp)
+
+    if automata is None:
+        automata = build(regexp)
+        cache.store(cache_dir, regexp, automata)
+
+    return automata
+
+
+def build(regexp: str) -> VA:
+    '''
+    Compile a regexp to a non-deterministic variable automata, without using
+    any cache.
+    '''
+    regexp, has_strong_begin, has_strong_end = anchors(regexp)
+    literals = ExtractLiterals().transform(parser(regexp))
+    regexp = wrap(regexp, has_strong_begin, has_strong_end)
+
     tree = parser(regexp)
     automata = ASTtoNFA().transform(tree)
     automata.reorder_states()
+    automata.prefilter = Prefilter(literals, has_strong_begin, has_strong_end)
+    return automata
+
+
+def compile_many(regexps: dict) -> VA:
+    '''
+    Compile a dictionary of named regexps to a single variable automata
+    matching the union of the regexps. Each regexp has its own variables, the
+    name of the regexp each variable comes from is given by `pattern_of`.
+    '''
+    transformer = ASTtoNFA()
+    fragments = []
+    literals = []
+    anchored = False
+    pattern_of = dict()
+
+    for name, regexp in regexps.items():
+        regexp, has_strong_begin, has_strong_end = anchors(regexp)
+        anchored = anchored or has_strong_begin or has_strong_end
+        literals.append(ExtractLiterals().transform(parser(regexp)))
+        regexp = wrap(regexp, has_strong_begin, has_strong_end)
+
+        nb_variables = len(transformer.variables)
+        fragments.append(transformer.transform(parser(regexp).children[0]))
+
+        for variable in transformer.variables[nb_variables:]:
+            pattern_of[variable] = name
+
+    fragment = reduce(lambda left, right: transformer.union([left, right]),
+                      fragments)
+    automata = transformer.regexp([fragment])
+    automata.reorder_states()
+    automata.pattern_of = pattern_of
+
+    # Windows around literals are only valid if no regexp is anchored
+    if not anchored:
+        union = reduce(lambda left, right: ExtractLiterals().union(
+            [left, right]), literals)
+        automata.prefilter = Prefilter(union, False, False)
+
     return automata
 
 
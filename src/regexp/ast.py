@@ -7,6 +7,9 @@ class EnumerateVariables(Transformer):
         children[0] = {str(children[0])}
         return set.union(*children)
 
+    def repeat(self, children):
+        return children[0]
+
     def __default__(self, data, children, meta):
         if not children:
             return set()
@@ -0,0 +1,65 @@
+import hashlib
+import os
+import pickle
+import tempfile
+
+from va import VA
+
+
+# Version of the entries stored in a cache directory, entries written with
+# another version are ignored
+CACHE_VERSION = 1
+
+
+def cache_path(cache_dir: str, regexp: str) -> str:
+    '''
+    Get the path of the entry of a regexp in a cache directory.
+    '''
+    key = hashlib.sha256(f'{CACHE_VERSION}:{regexp}'.encode()).hexdigest()
+    return os.path.join(cache_dir, f'{key}.pickle')
+
+
+def load(cache_dir: str, regexp: str) -> VA:
+    '''
+    Load the automaton compiled from a regexp stored in a cache directory, or
+    None if there is no valid entry for this regexp.
+    '''
+    # Stale or corrupted entries can fail to load in many ways, e.g. when
+    # they refer to classes that were renamed
+    #pylint: disable=broad-except
+    try:
+        with open(cache_path(cache_dir, regexp), 'rb') as src:
+            entry = pickle.load(src)
+
+        if entry['version'] != CACHE_VERSION or entry['regexp'] != regexp:
+            return None
+
+        automata = entry['automata']
+
+        if automata.fingerprint() != entry['fingerprint']:
+            return None
+    except Exception:
+        return None
+
+    return automata
+
+
+def store(cache_dir: str, regexp: str, automata: VA):
+    '''
+    Store the automaton compiled from a regexp in a cache directory. The entry
+    is written to a temporary file first so that concurrent processes never
+    read a partial entry. The cache is only a hint, failures are ignored.
+    '''
+    entry = {'version': CACHE_VERSION, 'regexp': regexp,
+             'fingerprint': automata.fingerprint(), 'automata': automata}
+
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+
+        with tempfile.NamedTemporaryFile(dir=cache_dir, suffix='.tmp',
+                                         delete=False) as dest:
+            pickle.dump(entry, dest, protocol=pickle.HIGHEST_PROTOCOL)
+
+        os.replace(dest.name, cache_path(cache_dir, regexp))
+    except OSError:
+        pass
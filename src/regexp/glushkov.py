@@ -11,6 +11,8 @@ class ASTtoNFA(Transformer):
         # is the character class actually matched by the atom
         self.nb_atoms = 0
         self.atoms = dict()
+        # Variables created for named groups, in order of creation
+        self.variables = []
 
         super().__init__(*args, **kwargs)
 
@@ -20,6 +22,33 @@ class ASTtoNFA(Transformer):
         self.atoms[atom_id] = atom
         return atom_id
 
+    def copy_fragment(self, fragment):
+        '''
+        Copy a fragment with new atoms, named groups of the copy are bound to
+        new variables.
+        '''
+        P, D, F, G = fragment
+        positions = sorted(set(P) | set(F)
+                           | {atom for edge in D for atom in edge})
+        variables = dict()
+        ids = dict()
+
+        for position in positions:
+            atom = self.atoms[position]
+
+            if isinstance(atom, Variable.Marker):
+                if atom.variable not in variables:
+                    variables[atom.variable] = Variable(atom.variable.name)
+                    self.variables.append(variables[atom.variable])
+
+                atom = Variable.Marker(variables[atom.variable], atom.type)
+
+            ids[position] = self.register_atom(atom)
+
+        return ([ids[atom] for atom in P],
+                [(ids[source], ids[target]) for source, target in D],
+                [ids[atom] for atom in F], G)
+
     def regexp(self, sub):
         P, D, F, G = sub[0]
 
@@ -73,6 +102,7 @@ class ASTtoNFA(Transformer):
         name, (P, D, F, G) = sub
 
         variable = Variable(str(name))
+        self.variables.append(variable)
         open_id = self.register_atom(variable.marker_open())
         close_id = self.register_atom(variable.marker_close())
 
@@ -108,6 +138,51 @@ class ASTtoNFA(Transformer):
     def range(self, sub):
         return tuple(map(str, sub))
 
+    def repeat(self, sub):
+        '''
+        Chain copies of the repeated fragment, the copies following the lower
+        bound can be left out. If the fragment matches the empty word, leaving
+        out a copy is the same as using fewer copies, so the copies don't
+        match it: otherwise each copy would be followed by all the next ones,
+        with a number of transitions quadratic in the bounds.
+        '''
+        fragment, min_occ, max_occ = sub
+
+        if fragment[3]:
+            fragment = fragment[:3] + (False,)
+            min_occ = 0
+
+            if max_occ is None:
+                return self.star([fragment])
+
+        nb_copies = min_occ if max_occ is None else max_occ
+
+        if nb_copies == 0:
+            return self.empty([])
+
+        copies = [fragment] + [self.copy_fragment(fragment)
+                               for _ in range(nb_copies - 1)]
+
+        P = copies[0][0]
+        F = [atom for _, _, copy_F, _ in copies[max(min_occ, 1) - 1:]
+             for atom in copy_F]
+        G = min_occ == 0
+        D = []
+
+        for _, copy_D, _, _ in copies:
+            D.extend(copy_D)
+
+        for (_, _, prev_F, _), (next_P, _, _, _) in zip(copies, copies[1:]):
+            D.extend((prefix, suffix) for prefix in prev_F for suffix in next_P)
+
+        # The last copy can be repeated if there is no upper bound
+        if max_occ is None:
+            last_P, _, last_F, _ = copies[-1]
+            D.extend((prefix, suffix) for prefix in last_F
+                     for suffix in last_P)
+
+        return P, D, F, G
+
     def star(self, sub):
         P, D, F, _ = sub[0]
 
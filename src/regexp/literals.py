@@ -0,0 +1,308 @@
+from itertools import product
+
+from lark import Transformer
+
+
+# Maximal number of alternative strings kept for a literal
+MAX_ALTERNATIVES = 16
+
+
+def bounded(strings):
+    '''
+    Return the given set of strings, or None if it is too large to be kept.
+    '''
+    strings = frozenset(strings)
+    return strings if len(strings) <= MAX_ALTERNATIVES else None
+
+
+def concat(left, right):
+    '''
+    Concatenate two sets of alternative strings.
+    '''
+    if left is None or right is None \
+            or len(left) * len(right) > MAX_ALTERNATIVES:
+        return None
+
+    return frozenset(a + b for a, b in product(left, right))
+
+
+def informative(strings) -> bool:
+    '''
+    Check if a set of alternative strings holds any information, that is if
+    none of the alternatives is empty.
+    '''
+    return strings is not None and '' not in strings
+
+
+def best_factor(factors: list):
+    '''
+    Select the required literal which is the most selective: the one whose
+    shortest alternative is the longest.
+    '''
+    if not factors:
+        return None
+
+    return max(factors, key=lambda factor: (min(map(len, factor)),
+                                            -len(factor)))
+
+
+class Literals:
+    '''
+    Literal information about a regular expression:
+     - exact: set of strings matched by the expression, if it is small
+     - prefixes / suffixes: every match starts / ends with one of these
+     - required: list of sets of strings, every match contains one string of
+       each of these sets
+     - max_length: maximal length of a match, None if it is unbounded
+
+    Sets of strings are None if they are too large to be stored.
+    '''
+    def __init__(self, exact=None, prefixes=frozenset({''}),
+                 suffixes=frozenset({''}), required=(), max_length=None):
+        self.exact = exact
+        self.prefixes = prefixes if informative(prefixes) else frozenset({''})
+        self.suffixes = suffixes if informative(suffixes) else frozenset({''})
+        self.max_length = max_length
+
+        if informative(exact):
+            required = list(required) + [exact]
+
+        # Remove duplicated factors, keeping their order
+        self.required = list(dict.fromkeys(factor for factor in required
+                                           if informative(factor)))
+
+
+class ExtractLiterals(Transformer):
+    '''
+    Compute the `Literals` of an AST produced by `regexp.parse.parser`.
+    '''
+    #pylint: disable=no-self-use
+    def regexp(self, sub):
+        return sub[0]
+
+    def empty(self, _sub):
+        return Literals(exact=frozenset({''}), max_length=0)
+
+    def normal_char(self, sub):
+        char = str(sub[0])
+        return Literals(exact=frozenset({char}), prefixes=frozenset({char}),
+                        suffixes=frozenset({char}), max_length=1)
+
+    def escaped_char(self, sub):
+        return self.normal_char(sub)
+
+    def class_normal_char(self, sub):
+        return str(sub[0]), str(sub[0])
+
+    def class_escaped_char(self, sub):
+        return str(sub[0]), str(sub[0])
+
+    def range(self, sub):
+        return tuple(map(str, sub))
+
+    def charclass(self, sub):
+        chars = set()
+
+        for first, last in sub:
+            if ord(last) - ord(first) >= MAX_ALTERNATIVES:
+                return Literals(max_length=1)
+
+            chars.update(map(chr, range(ord(first), ord(last) + 1)))
+
+        exact = bounded(chars)
+        return Literals(exact=exact, prefixes=exact, suffixes=exact,
+                        max_length=1)
+
+    def charclass_complement(self, _sub):
+        return Literals(max_length=1)
+
+    def wildcard(self, _sub):
+        return Literals(max_length=1)
+
+    def named_group(self, sub):
+        return sub[1]
+
+    def concatenation(self, sub):
+        left, right = sub
+        prefixes = left.prefixes
+        suffixes = right.suffixes
+
+        if left.exact is not None:
+            prefixes = concat(left.exact, right.prefixes)
+
+            if not informative(prefixes):
+                prefixes = left.prefixes
+
+        if right.exact is not None:
+            suffixes = concat(left.suffixes, right.exact)
+
+            if not informative(suffixes):
+                suffixes = right.suffixes
+
+        max_length = None
+
+        if left.max_length is not None and right.max_length is not None:
+            max_length = left.max_length + right.max_length
+
+        return Literals(exact=concat(left.exact, right.exact),
+                        prefixes=prefixes, suffixes=suffixes,
+                        required=(left.required + right.required
+                                  + [concat(left.suffixes, right.prefixes)]),
+                        max_length=max_length)
+
+    def union(self, sub):
+        left, right = sub
+        exact = None
+        required = []
+        max_length = None
+
+        if left.exact is not None and right.exact is not None:
+            exact = bounded(left.exact | right.exact)
+
+        # A match of the union contains a required literal of one side
+        if left.required and right.required:
+            required.append(bounded(best_factor(left.required)
+                                    | best_factor(right.required)))
+
+        if left.max_length is not None and right.max_length is not None:
+            max_length = max(left.max_length, right.max_length)
+
+        return Literals(exact=exact,
+                        prefixes=bounded(left.prefixes | right.prefixes),
+                        suffixes=bounded(left.suffixes | right.suffixes),
+                        required=required, max_length=max_length)
+
+    def optional(self, sub):
+        exact = None
+
+        if sub[0].exact is not None:
+            exact = bounded(sub[0].exact | {''})
+
+        return Literals(exact=exact, max_length=sub[0].max_length)
+
+    def plus(self, sub):
+        max_length = sub[0].max_length if sub[0].max_length == 0 else None
+        return Literals(prefixes=sub[0].prefixes, suffixes=sub[0].suffixes,
+                        required=sub[0].required, max_length=max_length)
+
+    def repeat(self, sub):
+        # Same literals as the expansion of the repetition into concatenations
+        # of copies followed by nested optional copies
+        literals, min_occ, max_occ = sub
+        ret = self.empty([])
+
+        for i in range(min_occ):
+            if i == min_occ - 1 and max_occ is None:
+                ret = self.concatenation([ret, self.plus([literals])])
+            else:
+                ret = self.concatenation([ret, literals])
+
+        if max_occ is not None:
+            optionals = self.empty([])
+
+            for _ in range(max_occ - min_occ):
+                optionals = self.optional(
+                    [self.concatenation([literals, optionals])])
+
+            ret = self.concatenation([ret, optionals])
+
+        return ret
+
+    def star(self, sub):
+        max_length = sub[0].max_length if sub[0].max_length == 0 else None
+        return Literals(max_length=max_length)
+
+
+class Prefilter:
+    '''
+    Fast checks on a document performed before building a DAG, based on the
+    literals of a pattern.
+    '''
+    def __init__(self, literals: Literals, strong_begin: bool,
+                 strong_end: bool):
+        self.literals = literals
+        self.strong_begin = strong_begin
+        self.strong_end = strong_end
+        self.factor = best_factor(literals.required)
+
+    def accepts(self, document: str) -> bool:
+        '''
+        Check if the document may contain a match.
+        '''
+        if self.strong_begin and not document.startswith(
+                tuple(self.literals.prefixes)):
+            return False
+
+        if self.strong_end and not document.endswith(
+                tuple(self.literals.suffixes)):
+            return False
+
+        return all(any(literal in document for literal in factor)
+                   for factor in self.literals.required)
+
+    def accepts_chunks(self, chunks) -> bool:
+        '''
+        Check if a document given as an iterable of chunks may contain a
+        match, as `accepts` does. The end of each chunk is kept with the next
+        one so that literals spanning several chunks are found.
+        '''
+        width = max([1] + [len(literal)
+                           for strings in [self.literals.prefixes,
+                                           self.literals.suffixes,
+                                           *self.literals.required]
+                           for literal in strings])
+        missing = self.literals.required
+        head = ''
+        tail = ''
+
+        for chunk in chunks:
+            text = tail + chunk
+
+            if len(head) < width:
+                head = (head + chunk)[:width]
+
+            missing = [factor for factor in missing
+                       if not any(literal in text for literal in factor)]
+            tail = text[-width:]
+
+        if self.strong_begin and not head.startswith(
+                tuple(self.literals.prefixes)):
+            return False
+
+        if self.strong_end and not tail.endswith(
+                tuple(self.literals.suffixes)):
+            return False
+
+        return not missing
+
+    def windows(self, document: str):
+        '''
+        Get a list of disjoint windows `(start, end)` of the document such
+        that any match is included in one of them, or None if the matches
+        can't be located.
+        '''
+        if self.strong_begin or self.strong_end or self.factor is None \
+                or self.literals.max_length is None:
+            return None
+
+        max_length = self.literals.max_length
+        windows = []
+
+        for literal in self.factor:
+            start = document.find(literal)
+
+            while start != -1:
+                windows.append((max(0, start + len(literal) - max_length),
+                                min(len(document), start + max_length)))
+                start = document.find(literal, start + 1)
+
+        windows.sort()
+        ret = []
+
+        for start, end in windows:
+            if ret and start <= ret[-1][1]:
+                ret[-1] = (ret[-1][0], max(ret[-1][1], end))
+            else:
+                ret.append((start, end))
+
+        return ret
@@ -1,16 +1,83 @@
 #pylint: disable=no-self-use
+import hashlib
+import os
+import pickle
 from functools import lru_cache
+import lark
 from lark import Lark, Transformer, Token, Tree
 
 import regexp.grammar as grammar
 
 
+# Non-terminals the parser can start from, the rewrite rules of the grammar
+# are parsed from their own non-terminal
+START_SYMBOLS = ['regexp'] + sorted(
+    {non_terminal for non_terminal, _ in grammar.SPECIAL_CHARS_REWRITE.values()}
+    | {non_terminal
+       for non_terminal, _ in grammar.CLASS_SPECIAL_CHARS_REWRITE.values()})
+
+# Serialized parser, generated at install time by `make parser`
+PARSER_PATH = os.path.join(os.path.dirname(__file__), 'parser.lark')
+
+
+def grammar_digest() -> str:
+    '''
+    Get a digest of the grammar and of the version of lark, which identifies
+    the serialized parsers built from it.
+    '''
+    content = repr((grammar.GRAMMAR, START_SYMBOLS, lark.__version__))
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def build_parser() -> Lark:
+    return Lark(grammar.GRAMMAR, parser='lalr', start=START_SYMBOLS)
+
+
+def save_parser(path: str = PARSER_PATH, parser: Lark = None):
+    '''
+    Save the tables of a parser to a file, so that they don't need to be
+    computed each time the module is loaded. The file is written to a
+    temporary file first so that concurrent processes never read a partial
+    parser, the temporary file is removed if the parser can't be saved.
+    '''
+    parser = build_parser() if parser is None else parser
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+
+    try:
+        with open(tmp_path, 'wb') as dest:
+            pickle.dump(grammar_digest(), dest)
+            parser.save(dest)
+
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def load_parser(path: str = PARSER_PATH) -> Lark:
+    '''
+    Load a parser saved with `save_parser`, or None if the file can't be
+    loaded or was generated from another grammar or version of lark.
+    '''
+    #pylint: disable=broad-except
+    try:
+        with open(path, 'rb') as src:
+            if pickle.load(src) != grammar_digest():
+                return None
+
+            return Lark.load(src)
+    except Exception:
+        return None
+
+
 @lru_cache(None)
-def get_parser_for(start: str = 'regexp'):
+def get_parser() -> Lark:
     '''
-    Get the parser used to compute the AST from a given non-terminal `start`.
+    Get the parser used to compute the AST, which is loaded from the
+    serialized parser if it is available and up to date. Otherwise the parser
+    is built, the package directory is never written at runtime.
     '''
-    return Lark(grammar.GRAMMAR, parser='lalr', start=start)
+    return load_parser() or build_parser()
 
 
 @lru_cache(100)
@@ -18,7 +85,7 @@ def parse_from(start: str, regexp: str):
     '''
     Parse the expression from a given non-terminal.
     '''
-    return get_parser_for(start).parse(regexp)
+    return get_parser().parse(regexp, start=start)
 
 
 class RewriteSpecials(Transformer):
@@ -81,28 +148,9 @@ class RewriteSpecials(Transformer):
         if min_occ == 0 and max_occ is None:
             return Tree('star', [sub])
 
-        # Add path for the lower bound
-        replacement = Tree('empty', [])
-
-        for i in range(min_occ):
-            if i == min_occ-1 and max_occ is None:
-                # The last item is a plus if there is no upper bound
-                replacement = Tree('concatenation', [replacement,
-                                                     Tree('plus', [sub])])
-            else:
-                replacement = Tree('concatenation', [replacement, sub])
-
-        # Add path to allow the upper bound
-        if max_occ is not None:
-            optionals = Tree('empty', [])
-
-            for _ in range(max_occ - min_occ):
-                optionals = Tree(
-                    'optional', [Tree('concatenation', [sub, optionals])])
-
-            replacement = Tree('concatenation', [replacement, optionals])
-
-        return replacement
+        # Other bounds are kept as integers, the subtree is not expanded to
+        # keep the depth of the AST independent of the bounds
+        return Tree('repeat', [sub, min_occ, max_occ])
 
 
 def parser(regexp: str):
@@ -0,0 +1,26 @@
+from enum_mappings.indexed_dag import IndexedDag
+from enum_mappings.jump import EmptyLevel
+import examples
+
+
+def dags(**options):
+    '''
+    Iterate over triples (automata, document, dag) of all examples, the DAG
+    is built with the given options and documents without any match are
+    skipped.
+    '''
+    for example in examples.INSTANCES:
+        for document in example['documents']:
+            try:
+                yield (example['automata'], document,
+                       IndexedDag(example['automata'], document, **options))
+            except EmptyLevel:
+                continue
+
+
+def normalize_mappings(mappings) -> list:
+    '''
+    Get a representation of a list of mappings that doesn't depend on the
+    order of markers inside of each mapping.
+    '''
+    return [str(sorted(mapping)) for mapping in mappings]
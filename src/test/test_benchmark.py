@@ -0,0 +1,10 @@
+import benchmark
+
+
+def test_delay_stats():
+    assert benchmark.measure_delays([]) == []
+    assert len(benchmark.measure_delays(range(10))) == 9
+    assert len(benchmark.measure_delays(range(10), limit=3)) == 3
+
+    stats = benchmark.delay_stats([float(i) for i in range(100, 0, -1)])
+    assert stats == {'outputs': 100, 'p50': 51, 'p99': 100, 'max': 100}
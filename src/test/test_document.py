@@ -0,0 +1,36 @@
+import io
+
+import regexp
+from document import Document
+from enum_mappings import enum_matches
+
+
+TEXT = 'aé@b€ xy@zé ab@@c\n'
+
+
+def sources():
+    yield io.StringIO(TEXT)
+    yield iter([TEXT[i:i+3] for i in range(0, len(TEXT), 3)])
+
+
+def test_slices():
+    for source in sources():
+        document = Document(source, chunk_size=4, strip_newline=True)
+        assert ''.join(document.read()) == TEXT[:-1]
+        assert len(document) == len(TEXT) - 1
+
+        for start in range(len(TEXT)):
+            for stop in range(start, len(TEXT)):
+                assert document[start:stop] == TEXT[:-1][start:stop]
+
+        assert document[-1] == TEXT[-2]
+
+
+def test_streamed_matches():
+    automata = regexp.compile('\\w+@\\w+')
+    expected = sorted((m.span, m.string) for m in enum_matches(automata, TEXT))
+
+    for source in sources():
+        document = Document(source, chunk_size=4)
+        matches = enum_matches(automata, document)
+        assert sorted((m.span, m.string) for m in matches) == expected
@@ -1,7 +1,18 @@
+import os
+import sys
+
 import pytest
 
 import examples
-from enum_mappings import enum_mappings, naive_enum_mappings
+import regexp
+from enum_mappings import (count_matches, enum_mappings, enum_matches,
+                           enum_matches_batch, naive_enum_mappings)
+from enum_mappings.indexed_dag import IndexedDag
+from enum_mappings.jump import EmptyLevel
+from enum_mappings.parallel import WorkerError
+from enum_mappings.trimming import MemoryBudget
+from helpers import dags, normalize_mappings
+from mapping import match_of_mapping
 
 
 def test_run_example():
@@ -14,3 +25,242 @@ def test_run_example():
         for document in example['documents']:
             res_standart = normalize_mapping(enum_mappings(automata, document))
             res_naive = normalize_mapping(naive_enum_mappings(automata, document))
+            assert res_standart == res_naive
+
+
+def test_trimming_policies():
+    def normalize_mapping(mapping):
+        return set(str(sorted(spanner)) for spanner in mapping)
+
+    for example in examples.INSTANCES:
+        automata = example['automata']
+
+        for document in example['documents']:
+            try:
+                expected = normalize_mapping(IndexedDag(automata, document))
+            except EmptyLevel:
+                continue
+
+            for budget in [0, 1 << 30]:
+                trimming = MemoryBudget(budget)
+                dag = IndexedDag(automata, document, trimming=trimming)
+                assert normalize_mapping(dag) == expected
+                assert trimming.usage == dag.jump.nbytes()
+
+                if budget:
+                    assert trimming.stats()['cleanups'] == 0
+
+    # Levels are not inspected again when the budget can't be reached
+    trimming = MemoryBudget(0)
+    clean = trimming.clean
+    inspected = []
+
+    def counting_clean(jump, level, nonjump_closure):
+        inspected.append(level)
+        return clean(jump, level, nonjump_closure)
+
+    trimming.clean = counting_clean
+    IndexedDag(regexp.compile(r'(?P<x>\w+)@(?P<y>\w+)'), 'ab@cd ' * 100,
+               trimming, progress=False)
+    assert len(inspected) < 10 * 600
+
+
+def test_pruning():
+    def normalize_mapping(mapping):
+        return set(str(sorted(spanner)) for spanner in mapping)
+
+    for example in examples.INSTANCES:
+        automata = example['automata']
+
+        for document in example['documents']:
+            try:
+                expected = normalize_mapping(IndexedDag(automata, document))
+            except EmptyLevel:
+                expected = set()
+
+            for source in [document, iter([document])]:
+                try:
+                    dag = IndexedDag(automata, source, prune=True)
+                    assert normalize_mapping(dag) == expected
+                except EmptyLevel:
+                    assert not expected
+
+
+def test_pruning_many_assignations():
+    # More than 255 paths of assignations lead to the same state
+    groups = '|'.join(f'(?P<g{index}>)' for index in range(256))
+    automata = regexp.compile(f'({groups})b')
+    expected = sum(1 for _ in IndexedDag(automata, 'xb', progress=False))
+    dag = IndexedDag(automata, 'xb', prune=True, progress=False)
+    assert expected == 256
+    assert sum(1 for _ in dag) == expected
+
+
+def test_cache_sizes():
+    for automata, document, dag in dags():
+        expected = normalize_mappings(dag)
+
+        for size in [0, 1]:
+            dag = IndexedDag(automata, document, cache_size=size)
+            assert normalize_mappings(dag) == expected
+
+
+def test_reset():
+    def normalize_mapping(mapping):
+        return [str(sorted(spanner)) for spanner in mapping]
+
+    for example in examples.INSTANCES:
+        automata = example['automata']
+        dag = IndexedDag(automata, '', progress=False)
+
+        for document in example['documents'] * 2:
+            try:
+                expected = normalize_mapping(IndexedDag(automata, document))
+            except EmptyLevel:
+                continue
+
+            dag.reset(document)
+            assert normalize_mapping(dag) == expected
+            assert dag.count_mappings() == len(expected)
+
+
+def test_parallel_enumeration():
+    def normalize_mapping(mapping):
+        return [str(sorted(spanner)) for spanner in mapping]
+
+    for example in examples.INSTANCES:
+        automata = example['automata']
+
+        for document in example['documents']:
+            try:
+                dag = IndexedDag(automata, document)
+            except EmptyLevel:
+                continue
+
+            expected = normalize_mapping(dag)
+            ordered = normalize_mapping(dag.parallel_iter(3, ordered=True))
+            unordered = normalize_mapping(dag.parallel_iter(3))
+            assert ordered == expected
+            assert sorted(unordered) == sorted(expected)
+
+
+def test_count():
+    for example in examples.INSTANCES:
+        automata = example['automata']
+
+        for document in example['documents']:
+            try:
+                dag = IndexedDag(automata, document)
+            except EmptyLevel:
+                continue
+
+            assert dag.count_mappings() == sum(1 for _ in dag)
+
+    for pattern in ['a+b', r'(?P<x>a*)(?P<y>b*)', r'\w+@\w+', '']:
+        for document in ['', 'aabab', 'a@b c@dd']:
+            expected = sum(1 for _ in enum_matches(regexp.compile(pattern),
+                                                   document))
+            assert count_matches(regexp.compile(pattern),
+                                 document) == expected
+
+    # Several variables named `match`
+    automata = [regexp.compile('(?P<match>a)(?P<match>b)?'),
+                regexp.compile_many({'ab': 'a+b', 'x': '(?P<x>a|b)'})]
+
+    for automaton in automata:
+        for document in ['', 'aabab', 'a@b c@dd']:
+            expected = len(list(enum_matches(automaton, document,
+                                             progress=False)))
+            assert count_matches(automaton, document,
+                                 progress=False) == expected
+
+
+def test_random_access():
+    def normalize_mapping(mapping):
+        return str(sorted(mapping))
+
+    for example in examples.INSTANCES:
+        automata = example['automata']
+
+        for document in example['documents']:
+            try:
+                dag = IndexedDag(automata, document)
+            except EmptyLevel:
+                continue
+
+            mappings = [normalize_mapping(mapping) for mapping in dag]
+
+            for index in range(-len(mappings), len(mappings)):
+                assert normalize_mapping(dag.nth(index)) == mappings[index]
+
+            with pytest.raises(IndexError):
+                dag.nth(len(mappings))
+
+            sample = [normalize_mapping(mapping)
+                      for mapping in dag.sample(len(mappings) // 2, seed=1)]
+            assert len(set(sample)) == len(sample)
+            assert set(sample) <= set(mappings)
+
+    # More mappings than `sys.maxsize`
+    automata = regexp.compile(''.join(f'(?P<x{i}>a*)' for i in range(12)))
+    dag = IndexedDag(automata, 'a' * 200, progress=False)
+    assert dag.count_mappings() > sys.maxsize
+    assert len(set(map(normalize_mapping, dag.sample(3, seed=1)))) == 3
+
+    with pytest.raises(ValueError):
+        IndexedDag(automata, 'a', progress=False).sample(1000)
+
+
+def test_sorted_enumeration():
+    for pattern in [r'(?P<x>a*)(?P<y>b*)', r'\w+@\w+', r'.*(?P<x>.*).*']:
+        for document in ['', 'aabab', 'a@b c@dd']:
+            automata = regexp.compile(pattern)
+            expected = [match.span for match in enum_matches(automata,
+                                                             document)]
+
+            try:
+                dag = IndexedDag(automata, document)
+            except EmptyLevel:
+                continue
+
+            for order, key in [('span', lambda span: span),
+                               ('end', lambda span: span[1])]:
+                for reverse in [False, True]:
+                    spans = [match_of_mapping(document, automata.variables,
+                                              mapping).span
+                             for mapping in dag.sorted_iter(order, reverse)]
+                    assert sorted(spans) == sorted(expected)
+                    assert spans == sorted(spans, key=key, reverse=reverse)
+
+
+def test_batch():
+    automata = regexp.compile(r'(?P<user>\w+)@(?P<host>\w+)')
+    records = ['a@b', '', 'no match', 'x@y z@ww'] * 100
+    expected = [(index, match.span, match.group_spans)
+                for index, record in enumerate(records)
+                for match in enum_matches(automata, record)]
+
+    for workers in [None, 2]:
+        matches = [(index, match.span, match.group_spans) for index, match
+                   in enum_matches_batch(automata, records, workers)]
+        assert matches == expected
+
+
+def test_parallel_enumeration_errors():
+    parent = os.getpid()
+    dag = IndexedDag(regexp.compile('(?P<x>a)b'), 'ab' * 300)
+    expand_frame = dag.expand_frame
+
+    def failing_expand_frame(*frame):
+        if os.getpid() != parent:
+            raise ValueError('expansion failed')
+
+        return expand_frame(*frame)
+
+    assert len(list(dag.parallel_iter(2, ordered=True))) == 300
+
+    dag.expand_frame = failing_expand_frame
+
+    for ordered in [False, True]:
+        with pytest.raises(WorkerError):
+            list(dag.parallel_iter(2, ordered=ordered))
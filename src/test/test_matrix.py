@@ -0,0 +1,71 @@
+import numpy
+
+from enum_mappings.matrix import BitMatrix, SparseMatrix
+
+
+def random_matrix(shape, density=0.3):
+    return numpy.random.default_rng(0).random(shape) < density
+
+
+def test_product():
+    for n, m, p in [(1, 1, 1), (3, 70, 5), (65, 130, 64), (10, 0, 4)]:
+        left = random_matrix((n, m))
+        right = random_matrix((m, p))
+        product = BitMatrix.from_dense(left) @ BitMatrix.from_dense(right)
+        assert (product.to_dense() == (left.astype(int) @ right > 0)).all()
+
+
+def test_count_and_delete():
+    dense = random_matrix((20, 100))
+    matrix = BitMatrix.from_dense(dense)
+
+    assert (matrix.count_rows() == dense.sum(axis=1)).all()
+    assert (matrix.count_rows([3, 64, 99]) ==
+            dense[:, [3, 64, 99]].sum(axis=1)).all()
+
+    for columns in [[], [0, 70], list(range(60, 70)), [63, 64, 99],
+                    list(range(100))]:
+        assert (matrix.delete_columns(columns).to_dense() ==
+                numpy.delete(dense, columns, axis=1)).all()
+    assert (matrix.delete_rows([1, 2]).to_dense() ==
+            numpy.delete(dense, [1, 2], axis=0)).all()
+
+
+def test_sparse():
+    for n, m, p in [(1, 1, 1), (3, 70, 5), (65, 130, 64), (10, 0, 4)]:
+        left = random_matrix((n, m), 0.05)
+        right = random_matrix((m, p), 0.05)
+        expected = left.astype(int) @ right > 0
+        sparse_left = SparseMatrix.from_dense(left)
+        sparse_right = SparseMatrix.from_dense(right)
+
+        assert ((sparse_left @ sparse_right).to_dense() == expected).all()
+        assert ((sparse_left @ BitMatrix.from_dense(right)).to_dense()
+                == expected).all()
+        assert ((BitMatrix.from_dense(left) @ sparse_right).to_dense()
+                == expected).all()
+
+    dense = random_matrix((20, 100), 0.05)
+    matrix = SparseMatrix.from_dense(dense)
+
+    assert (matrix.count_rows([3, 64, 99]) ==
+            dense[:, [3, 64, 99]].sum(axis=1)).all()
+    for columns in [[], [0, 70], list(range(60, 70)), [63, 64, 99],
+                    list(range(100))]:
+        assert (matrix.delete_columns(columns).to_dense() ==
+                numpy.delete(dense, columns, axis=1)).all()
+    assert (matrix.delete_rows([1, 2]).to_dense() ==
+            numpy.delete(dense, [1, 2], axis=0)).all()
+    assert all(matrix[i, j] == dense[i, j]
+               for i in range(20) for j in range(100))
+
+
+def test_rows_hitting():
+    dense = random_matrix((30, 150), 0.05)
+
+    for columns in [[], [0], [3, 64, 149], list(range(150))]:
+        expected = dense[:, columns].any(axis=1)
+
+        for matrix in [BitMatrix.from_dense(dense),
+                       SparseMatrix.from_dense(dense)]:
+            assert (matrix.rows_hitting(columns) == expected).all()
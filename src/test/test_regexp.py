@@ -1,4 +1,12 @@
+import os
+import pickle
+
+import pytest
+
+from document import Document
+from enum_mappings import count_matches, enum_matches, enum_tagged_matches
 import regexp
+from regexp import cache, parse
 
 
 def test_wildcard():
@@ -98,3 +106,172 @@ def test_end_token():
     assert regexp.match('bar$', 'foobar')
     assert regexp.match('foo', 'foobar')
     assert not regexp.match('foo$', 'foobar')
+
+
+def test_unicode():
+    assert regexp.match('^é+$', 'éé')
+    assert regexp.match('^[^a-z]$', '€')
+    assert regexp.match('^.$', '\U0001F600')
+    assert not regexp.match('^[a-z]$', 'é')
+
+
+def test_alphabet_partition():
+    automata = regexp.compile('^[a-z]x|[^a-c].$')
+    classes = automata.classify('abcxyz€')
+
+    assert len(automata.get_alphabet_partition()[2]) == 4
+    assert classes[0] == classes[1] == classes[2]
+    assert classes[4] == classes[5]
+    assert len(set(classes.tolist())) == 4
+
+
+def test_literals():
+    prefilter = regexp.compile('(?P<x>\\w+)@(?P<y>gmail|yahoo)\\.com').prefilter
+    assert prefilter.factor == {'@gmail.com', '@yahoo.com'}
+    assert prefilter.literals.max_length is None
+    assert prefilter.accepts('me@gmail.com')
+    assert not prefilter.accepts('me@hotmail.com')
+
+    prefilter = regexp.compile('a{2,3}b?').prefilter
+    assert prefilter.literals.prefixes == {'aa', 'aaa'}
+    assert prefilter.literals.max_length == 4
+    assert prefilter.windows('xxaaxxxxxxaxaab') == [(0, 6), (10, 15)]
+
+    assert not regexp.compile('^ab').prefilter.accepts('cab')
+    assert not regexp.compile('ab$').prefilter.accepts('abc')
+    assert regexp.compile('.*').prefilter.windows('abc') is None
+
+
+def test_prefilter_windows():
+    for pattern in ['a+b', 'ab|ba', '(?P<x>a)(?P<y>b|cc)@', 'c(?P<x>.)a']:
+        automata = regexp.compile(pattern)
+        document = 'abccab@ba' * 5
+        automata.prefilter = None
+        expected = sorted(match.span for match in
+                          enum_matches(automata, document))
+        automata = regexp.compile(pattern)
+        spans = [match.span for match in
+                 enum_matches(automata, document, order='span')]
+        assert spans == expected
+
+
+def test_prefilter_documents(tmp_path):
+    prefilter = regexp.compile('^ab.*cd$').prefilter
+    assert prefilter.accepts_chunks(['a', 'bxxc', 'd'])
+    assert not prefilter.accepts_chunks(['a', 'bxxc', 'dx'])
+    assert regexp.compile('b@c').prefilter.accepts_chunks(['xb', '@', 'cx'])
+    assert not regexp.compile('b@c').prefilter.accepts_chunks(['xb', 'c@'])
+
+    automata = regexp.compile('(?P<x>a)b@c')
+    path = tmp_path / 'document.txt'
+
+    for text in ['xxab@cxx' * 3, 'ab@ ' * 5]:
+        path.write_text(text + '\n')
+        expected = [match.span for match in enum_matches(automata, text)]
+
+        with open(path) as source:
+            document = Document(source, chunk_size=3, strip_newline=True)
+            assert [match.span for match in
+                    enum_matches(automata, document)] == expected
+
+        with open(path) as source:
+            document = Document(source, chunk_size=3, strip_newline=True)
+            assert count_matches(automata, document) == len(expected)
+
+
+def test_compile_many():
+    patterns = {'mail': '(?P<user>\\w+)@(?P<domain>\\w+)',
+                'number': '(?P<value>[0-9]+)',
+                'start': '^(?P<user>\\w)'}
+    document = 'bob@site 42'
+    automata = regexp.compile_many(patterns)
+    matches = sorted((name, match.span, sorted(match.group_spans.items()))
+                     for name, match in enum_tagged_matches(automata,
+                                                            document))
+    expected = sorted((name, match.span, sorted(match.group_spans.items()))
+                      for name, pattern in patterns.items()
+                      for match in enum_matches(regexp.compile(pattern),
+                                                document))
+    assert matches == expected
+
+
+def test_compile_cache(tmp_path):
+    pattern = '(?P<x>a+)@(?P<y>b|c)'
+    assert regexp.build(pattern).fingerprint() \
+        == regexp.compile(pattern).fingerprint()
+
+    # Altering a compiled automaton doesn't alter the next ones
+    automata = regexp.compile(pattern)
+    automata.prefilter = None
+    automata.transitions.clear()
+    assert regexp.compile(pattern).prefilter is not None
+    assert regexp.compile(pattern).fingerprint() \
+        == regexp.build(pattern).fingerprint()
+
+    stored = regexp.compile(pattern, tmp_path)
+    regexp.compile_cached.cache_clear()
+    loaded = regexp.compile(pattern, tmp_path)
+    assert loaded is not stored
+    assert loaded.fingerprint() == stored.fingerprint()
+    assert [match.span for match in enum_matches(loaded, 'aa@b a@c')] \
+        == [match.span for match in enum_matches(stored, 'aa@b a@c')]
+
+    # Entries that can't be loaded are compiled again
+    for entry in [{'not': 'an entry'}, pickle.loads]:
+        with open(cache.cache_path(str(tmp_path), pattern), 'wb') as dest:
+            pickle.dump(entry, dest)
+
+        regexp.compile_cached.cache_clear()
+        assert cache.load(str(tmp_path), pattern) is None
+        assert regexp.compile(pattern, tmp_path).fingerprint() \
+            == stored.fingerprint()
+
+
+def test_serialized_parser(tmp_path):
+    path = str(tmp_path / 'parser.lark')
+    assert parse.load_parser(path) is None
+
+    # Temporary files are removed when the parser can't be saved
+    with pytest.raises(AttributeError):
+        parse.save_parser(path, parser=object())
+
+    assert os.listdir(tmp_path) == []
+
+    umask = os.umask(0o022)
+    os.umask(umask)
+    parse.save_parser(path)
+    assert os.listdir(tmp_path) == ['parser.lark']
+    assert os.stat(path).st_mode & 0o777 == 0o666 & ~umask
+
+    loaded = parse.load_parser(path)
+    pattern = '(?P<x>a|\\w{2,3})[^b-d]*'
+
+    for start, text in [('regexp', pattern), ('atom', '[0-9]'),
+                        ('range', '0-9')]:
+        assert loaded.parse(text, start=start) \
+            == parse.build_parser().parse(text, start=start)
+
+    # Files that can't be loaded, e.g. written by another version of lark,
+    # are ignored
+    with open(path, 'r+b') as dest:
+        dest.seek(-16, os.SEEK_END)
+        dest.write(b'\0' * 16)
+
+    assert parse.load_parser(path) is None
+
+    with open(path, 'wb') as dest:
+        pickle.dump(parse.grammar_digest(), dest)
+        pickle.dump({'not': 'a parser'}, dest)
+
+    assert parse.load_parser(path) is None
+
+
+def test_repetition_size():
+    for pattern in ['a{1,%d}', '(a?b?){1,%d}', '(?P<x>a|bc){%d,}']:
+        small = regexp.build(pattern % 100)
+        large = regexp.build(pattern % 1000)
+        assert large.nb_states < 11 * small.nb_states
+        assert len(large.transitions) < 11 * len(small.transitions)
+
+    assert regexp.match('^(a?b?){2,300}c$', 'ab' * 250 + 'c')
+    assert not regexp.match('^(a?b?){2,300}c$', 'ab' * 350 + 'c')
@@ -0,0 +1,32 @@
+import pytest
+
+import regexp
+from enum_mappings import compile_matches
+from enum_mappings.indexed_dag import IndexedDag
+
+
+def normalize_mapping(mapping):
+    # Variables of distinct compilations have distinct ids, thus markers are
+    # compared by name
+    return set(str(sorted((str(marker), index) for marker, index in spanner))
+               for spanner in mapping)
+
+
+def test_save_load(tmp_path):
+    document = 'ab@cd a@b xyz@@w ' * 10
+    dag = compile_matches(regexp.compile('(?P<x>\\w+)@\\w+'), document)
+    dag.save(tmp_path / 'dag')
+
+    # The automaton can be compiled again in another process
+    automata = regexp.compile('(?P<x>\\w+)@\\w+')
+    loaded = IndexedDag.load(tmp_path / 'dag', automata, document)
+
+    assert normalize_mapping(loaded) == normalize_mapping(dag)
+
+    # A loaded DAG can be reused for another document
+    expected = normalize_mapping(compile_matches(automata, document[::-1]))
+    reused = compile_matches(automata, document[::-1], reuse=loaded)
+    assert normalize_mapping(reused) == expected
+
+    with pytest.raises(ValueError):
+        IndexedDag.load(tmp_path / 'dag', regexp.compile('\\w+@'), document)
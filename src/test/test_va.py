@@ -1,4 +1,5 @@
 from mapping import Variable
+from va import VA
 
 
 def test_variables():
@@ -24,3 +25,17 @@ def test_makers_order():
     assert var1.marker_open() < var1.marker_close()
     assert var2.marker_open() < var1.marker_close()
     assert var1.marker_open() < var2.marker_close()
+
+
+def test_marker_closure():
+    var_x = Variable('x')
+    var_y = Variable('y')
+    open_x, close_x = var_x.marker_open(), var_x.marker_close()
+    open_y = var_y.marker_open()
+    va = VA(4, [(0, open_x, 1), (1, close_x, 2), (0, open_y, 2), (2, 'a', 3)])
+
+    assert va.get_markers() == [open_x, close_x, open_y]
+    assert va.markers_of_mask(0b101) == [open_x, open_y]
+    assert va.get_marker_closure()[2] == {0b000: [2], 0b010: [1],
+                                          0b110: [0], 0b001: [0]}
+    assert va.get_marker_closure()[3] == {0b000: [3]}
@@ -1,7 +1,9 @@
+import hashlib
 import re
+import sys
 from collections import deque
 from functools import lru_cache
-from graphviz import Digraph
+import numpy
 
 from atoms import Atom
 from mapping import Variable
@@ -23,12 +25,26 @@ class VA:
         # marker
         self.transitions = transitions if transitions is not None else []
 
+        # Literal checks performed on documents before building a DAG, set
+        # when compiled from a regexp
+        self.prefilter = None
+        # Name of the pattern each variable comes from, set when compiled
+        # from several regexps
+        self.pattern_of = None
+
     def cache_clear(self):
         self.get_adj.cache_clear()
         self.get_coadj.cache_clear()
         self.get_variables.cache_clear()
-        self.get_adj_for_char.cache_clear()
+        self.get_alphabet_partition.cache_clear()
+        self.get_adj_for_class.cache_clear()
+        self.get_table_for_class.cache_clear()
         self.get_adj_for_assignations.cache_clear()
+        self.get_closure_for_assignations.cache_clear()
+        self.get_coreachable.cache_clear()
+        self.get_markers.cache_clear()
+        self.get_marker_closure.cache_clear()
+        self.fingerprint.cache_clear()
 
     @property
     def adj(self):
@@ -81,12 +97,67 @@ class VA:
 
         return list(ret)
 
+    @lru_cache(1)
+    def get_alphabet_partition(self):
+        '''
+        Partition the alphabet into classes of characters that can't be
+        distinguished by the atoms of the automaton.
+
+        Returns a tuple `(bounds, segment_class, representatives)`, where
+        `bounds` is the sorted list of the first code points of contiguous
+        segments of the alphabet, `segment_class[i]` is the class of the i-th
+        segment and `representatives[c]` is a character of class `c`.
+        '''
+        atoms = list({id(label): label for _, label, _ in self.transitions
+                      if isinstance(label, Atom)}.values())
+
+        # Bounds of segments over which every atom is constant
+        bounds = {0}
+
+        for atom in atoms:
+            for l, r in atom.ranges():
+                bounds.add(l)
+                bounds.add(r + 1)
+
+        bounds = sorted(bound for bound in bounds if bound <= sys.maxunicode)
+
+        # Merge segments matched by the same set of atoms
+        classes = dict()
+        representatives = []
+        segment_class = []
+
+        for bound in bounds:
+            char = chr(bound)
+            signature = tuple(atom.match(char) for atom in atoms)
+
+            if signature not in classes:
+                classes[signature] = len(classes)
+                representatives.append(char)
+
+            segment_class.append(classes[signature])
+
+        dtype = numpy.uint8 if len(classes) <= 1 << 8 else numpy.uint32
+        return (numpy.array(bounds, dtype=numpy.uint32),
+                numpy.array(segment_class, dtype=dtype),
+                representatives)
+
+    def classify(self, text: str):
+        '''
+        Map each character of a text to its class in the partition of the
+        alphabet given by `get_alphabet_partition`.
+        '''
+        bounds, segment_class, _ = self.get_alphabet_partition()
+        codes = numpy.frombuffer(text.encode('utf-32-le', 'surrogatepass'),
+                                 dtype='<u4')
+        return segment_class[numpy.searchsorted(bounds, codes, 'right') - 1]
+
     @lru_cache(None)
-    def get_adj_for_char(self, char):
+    def get_adj_for_class(self, char_class: int):
         '''
         Get the adjacency list representing transitions of the automaton that
-        can be used when reading a given char.
+        can be used when reading a char of the given class.
         '''
+        char = self.get_alphabet_partition()[2][char_class]
         res = [[] for _ in range(self.nb_states)]
 
         for source, label, target in self.transitions:
@@ -95,6 +166,20 @@ class VA:
 
         return res
 
+    @lru_cache(None)
+    def get_table_for_class(self, char_class: int):
+        '''
+        Get the dense successor table of transitions that can be used when
+        reading a char of the given class: cell (source, target) is set iff
+        there is such a transition from source to target.
+        '''
+        res = numpy.zeros((self.nb_states, self.nb_states), dtype=bool)
+
+        for source, targets in enumerate(self.get_adj_for_class(char_class)):
+            res[source, targets] = True
+
+        return res
+
     @lru_cache(1)
     def get_adj_for_assignations(self):
         '''
@@ -104,6 +189,49 @@ class VA:
         return [list(set(target for _, target in neighbours))
                 for neighbours in self.get_assignations()]
 
+    @lru_cache(1)
+    def get_closure_for_assignations(self):
+        '''
+        Get the dense table of states that can be reached from any state by
+        following a non-empty path of assignations.
+        '''
+        adj = self.get_adj_for_assignations()
+        res = numpy.zeros((self.nb_states, self.nb_states), dtype=bool)
+
+        for state in range(self.nb_states):
+            heap = list(adj[state])
+            res[state, heap] = True
+
+            while heap:
+                source = heap.pop()
+
+                for target in adj[source]:
+                    if not res[state, target]:
+                        res[state, target] = True
+                        heap.append(target)
+
+        return res
+
+    @lru_cache(1)
+    def get_coreachable(self):
+        '''
+        Get the mask of states from which a final state can be reached by
+        following any path of transitions.
+        '''
+        res = numpy.zeros(self.nb_states, dtype=bool)
+        res[self.final] = True
+        heap = list(self.final)
+
+        while heap:
+            target = heap.pop()
+
+            for _, source in self.coadj[target]:
+                if not res[source]:
+                    res[source] = True
+                    heap.append(source)
+
+        return res
+
     @lru_cache(1)
     def get_assignations(self):
         '''
@@ -120,37 +248,91 @@ class VA:
 
         return adj
 
-        # Compute closure
-        ret = [[] for _ in range(self.nb_states)]
+    @lru_cache(1)
+    def get_rev_assignations(self):
+        '''
+        Get the reverse of adjacency matrix obtained with `get_assignations`.
+        '''
+        adj = [[] for _ in range(self.nb_states)]
+
+        for source in range(self.nb_states):
+            for label, target in self.get_assignations()[source]:
+                adj[target].append((label, source))
+
+        return adj
+
+    @lru_cache(1)
+    def get_markers(self):
+        '''
+        Get the list of markers used in the automata, in a deterministic
+        order. Sets of markers are encoded as integers where the i-th marker
+        of this list is given by the bit `len(markers) - 1 - i`.
+        '''
+        markers = set(label for _, label, _ in self.transitions
+                      if isinstance(label, Variable.Marker))
+        return sorted(markers, key=lambda marker: (
+            str(marker.variable), marker.type.value, marker.variable.id))
+
+    def markers_of_mask(self, mask: int) -> list:
+        '''
+        Decode a set of markers encoded as an integer.
+        '''
+        markers = self.get_markers()
+        return [marker for i, marker in enumerate(markers)
+                if (mask >> (len(markers) - 1 - i)) & 1]
+
+    @lru_cache(1)
+    def get_marker_closure(self):
+        '''
+        Get, for each state, the states that can reach it by reading only
+        assignations, grouped by the exact set of markers read on the way.
+        The result is a list of dictionaries mapping sets of markers, encoded
+        as integers, to lists of states.
+        '''
+        markers = self.get_markers()
+        bits = {marker: 1 << (len(markers) - 1 - i)
+                for i, marker in enumerate(markers)}
+        adj = self.get_rev_assignations()
+        ret = []
 
         for state in range(self.nb_states):
-            seen = {state}
-            heap = [state]
+            seen = {(0, state)}
+            heap = [(0, state)]
 
             while heap:
-                source = heap.pop()
+                mask, source = heap.pop()
 
-                for (label, target) in adj[source]:
-                    ret[state].append((label, target))
+                for label, target in adj[source]:
+                    if (mask | bits[label], target) not in seen:
+                        seen.add((mask | bits[label], target))
+                        heap.append((mask | bits[label], target))
 
-                    if target not in seen:
-                        heap.append(target)
-                        seen.add(target)
+            closure = dict()
+
+            for mask, target in sorted(seen):
+                closure.setdefault(mask, []).append(target)
+
+            ret.append(closure)
 
         return ret
 
     @lru_cache(1)
-    def get_rev_assignations(self):
+    def fingerprint(self) -> str:
         '''
-        Get the reverse of adjacency matrix obtained with `get_assignations`.
+        Get a digest of the structure of the automaton, which doesn't depend
+        on the identity of its variables, only on their names.
         '''
-        adj = [[] for _ in range(self.nb_states)]
+        def label_repr(label):
+            if isinstance(label, Atom):
+                return f'{type(label).__name__}{label.ranges()}'
 
-        for source in range(self.nb_states):
-            for label, target in self.get_assignations()[source]:
-                adj[target].append((label, source))
+            return repr(label)
 
-        return adj
+        transitions = sorted((source, label_repr(label), target)
+                             for source, label, target in self.transitions)
+        content = repr((self.initial, self.nb_states, sorted(self.final),
+                        transitions))
+        return hashlib.sha256(content.encode()).hexdigest()
 
     def is_valid(self):
         for state in self.final:
@@ -184,6 +366,8 @@ class VA:
         self.cache_clear()
 
     def render(self, name, display=False):
+        # graphviz is only needed for rendering, don't load it on startup
+        from graphviz import Digraph  #pylint: disable=import-outside-toplevel
         dot = Digraph(name)
 
         dot.attr('node', shape='point')